@@ -0,0 +1,64 @@
+"""Multi-monitor encode time: whole desktop on one core vs per-monitor parts on a thread pool.
+
+Speedup is bounded by min(workers, monitors, cores); the machine's core
+count is printed with the results.
+
+Run from the repository root:
+    python benchmarks/bench_parallel_encode.py [--monitors 4] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.it_agent.capture import Frame, synthetic_frame  # noqa: E402
+from src.it_agent.screenshot import EncoderConfig, _encode_one  # noqa: E402
+
+MONITOR = (2560, 1440)
+
+
+def time_ms(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--monitors", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--formats", nargs="+", default=["png", "webp"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    width, height = MONITOR[0] * args.monitors, MONITOR[1]
+    frame = Frame.from_image(synthetic_frame((width, height)))
+    frame.monitors = [(i * MONITOR[0], 0, (i + 1) * MONITOR[0], height) for i in range(args.monitors)]
+    frame.select("all")
+    whole = frame.image
+    parts = [frame.region(box) for box in frame.part_boxes()]
+
+    print(f"cores: {os.cpu_count()}, desktop: {width}x{height} ({args.monitors} x {MONITOR[0]}x{MONITOR[1]})")
+    print(f"{'format':<8}{'workers':>8}{'ms':>10}{'speedup':>10}")
+    for fmt in args.formats:
+        config = EncoderConfig(fmt, budget=0)
+        single = time_ms(lambda: _encode_one(whole, config), args.runs)
+        print(f"{fmt:<8}{'whole':>8}{single:>10.0f}{1.0:>9.1f}x")
+        for workers in args.workers:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pool.submit(lambda: None).result()
+                elapsed = time_ms(lambda: [f.result() for f in
+                                           [pool.submit(_encode_one, p, config) for p in parts]], args.runs)
+            print(f"{fmt:<8}{workers:>8}{elapsed:>10.0f}{single / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
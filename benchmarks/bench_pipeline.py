@@ -0,0 +1,251 @@
+"""Screenshot pipeline microbenchmarks: capture overhead, encode, thumbnail and peak memory.
+
+Runs headless on synthetic desktop frames (no display needed) at 1080p,
+1440p, 4K, 3x1440p and 8K. For each size it records:
+
+    capture_ms    backend capture() of an in-memory frame (copy + Frame bookkeeping)
+    region_ms     cutting the full region out of a raw BGRX buffer frame
+    thumbnail_ms  image_to_thumbnail()
+    encode        ms and bytes per format / setting
+    peak_mb       RSS growth over one capture -> encode -> close cycle,
+                  measured in a fresh child process
+
+Results are printed as a table and, with --output, written as JSON.
+--compare checks them against a stored baseline and exits 1 if any
+time, size or memory figure regressed beyond its tolerance (25% for
+times and memory, 5% for sizes; differences under MIN_DELTA are
+noise). Times are scaled by a fixed zlib reference workload timed in
+both runs, so a machine that is uniformly slower today (throttling,
+a busy VM host) does not read as a regression; they are still only
+really comparable on the same machine, whose details are printed.
+
+Run from the repository root:
+    python benchmarks/bench_pipeline.py [--sizes 1080p 4K] [--output results.json]
+    python benchmarks/bench_pipeline.py --compare baseline.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["OCP_CAPTURE_BACKEND"] = "synthetic"
+
+import PIL  # noqa: E402
+import psutil  # noqa: E402
+from check_memory import PeakRSS  # noqa: E402
+from src.it_agent.capture import BACKENDS, Frame, SyntheticBackend  # noqa: E402
+from src.it_agent.screenshot import (  # noqa: E402
+    EncoderConfig, _encode_one, capture_screenshot, image_to_thumbnail,
+)
+
+MB = 1024 * 1024
+
+SIZES = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4K": (3840, 2160),
+    "3x1440p": (7680, 1440),
+    "8K": (7680, 4320),
+}
+
+ENCODINGS = {
+    "png-1": dict(fmt="png", compress_level=1, budget=0),
+    "png-6": dict(fmt="png", compress_level=6, budget=0),
+    "jpeg-85": dict(fmt="jpeg", quality=85, budget=0),
+    "webp-85": dict(fmt="webp", quality=85, budget=0),
+    "budget-512k": dict(fmt="png", budget=512 * 1024),
+}
+
+TOLERANCES = {"ms": 1.25, "bytes": 1.05, "mb": 1.25}
+MIN_DELTA = {"ms": 2.0, "bytes": 1024, "mb": 2.0}
+
+
+def time_ms(func, runs):
+    func()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def reference_ms(runs):
+    """Time a fixed CPU workload, used to normalise timings between runs."""
+    data = bytes(range(256)) * 4096 + b"ocp" * 300_000
+    return time_ms(lambda: zlib.compress(data, 6), max(runs, 5))
+
+
+def measure_peak(size):
+    """RSS growth (MB) over one full ticket cycle at `size`, in this process."""
+    BACKENDS["synthetic"].size = size
+    BACKENDS["synthetic"].grab()
+    gc.collect()
+    baseline = psutil.Process().memory_info().rss
+    with PeakRSS() as peak:
+        job, frame = capture_screenshot("all", EncoderConfig("png", budget=0))
+        for attachment in job.result():
+            attachment.view()
+        job.close()
+        frame.release()
+    return round((peak.peak - baseline) / MB, 1)
+
+
+def peak_in_child(size):
+    """Run measure_peak in a fresh interpreter so earlier sizes don't skew RSS."""
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--peak-child", f"{size[0]}x{size[1]}"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])["peak_mb"]
+
+
+def bench_size(size, encodings, runs):
+    backend = SyntheticBackend(size)
+    img = backend.grab()
+    raw = img.tobytes("raw", "BGRX")
+    raw_frame = Frame.from_buffer(raw, *size)
+    box = (0, 0) + size
+
+    result = {
+        "size": list(size),
+        "capture_ms": time_ms(backend.capture, runs),
+        "region_ms": time_ms(lambda: raw_frame.region(box), runs),
+        "thumbnail_ms": time_ms(lambda: image_to_thumbnail(img), runs),
+        "encode": {},
+    }
+    for name, kwargs in encodings.items():
+        config = EncoderConfig(**kwargs)
+        holder = {}
+
+        def encode():
+            holder["out"] = _encode_one(img, config)
+
+        ms = time_ms(encode, runs)
+        buf, _, _, params = holder.pop("out")
+        result["encode"][name] = {"ms": ms, "bytes": buf.getbuffer().nbytes,
+                                  "format": params["format"]}
+        buf.close()
+    del raw_frame, raw, img
+    result["peak_mb"] = peak_in_child(size)
+    return result
+
+
+def machine_info(runs):
+    return {
+        "reference_ms": reference_ms(runs),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cores": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def flatten(results):
+    """{"4K.encode.png-6.ms": 123.4, ...} for every numeric metric."""
+    flat = {}
+    for size_name, entry in results.items():
+        for key, value in entry.items():
+            if key == "encode":
+                for enc, metrics in value.items():
+                    flat[f"{size_name}.encode.{enc}.ms"] = metrics["ms"]
+                    flat[f"{size_name}.encode.{enc}.bytes"] = metrics["bytes"]
+            elif isinstance(value, (int, float)):
+                flat[f"{size_name}.{key}"] = value
+    return flat
+
+
+def unit_of(metric):
+    for unit in ("bytes", "mb"):
+        if metric.endswith(unit):
+            return unit
+    return "ms"
+
+
+def compare(current, baseline):
+    """Print current vs baseline for shared metrics; returns the regressed metric names."""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    print(f"\nbaseline: {baseline['meta']}")
+    print(f"current:  {current['meta']}")
+    speed = current["meta"]["reference_ms"] / baseline["meta"]["reference_ms"]
+    print(f"machine speed factor {speed:.2f} (times below are divided by it)")
+    print(f"{'metric':<36}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    regressed = []
+    for metric in sorted(now.keys() & before.keys()):
+        old, new = before[metric], now[metric]
+        unit = unit_of(metric)
+        if unit == "ms":
+            new = round(new / speed, 2)
+        ratio = new / old if old else 1.0
+        flag = ""
+        if ratio > TOLERANCES[unit] and new - old > MIN_DELTA[unit]:
+            flag = "  REGRESSED"
+            regressed.append(metric)
+        print(f"{metric:<36}{old:>12g}{new:>12g}{ratio:>7.2f}x{flag}")
+    return regressed
+
+
+def print_table(results):
+    encodings = list(next(iter(results.values()))["encode"])
+    header = f"{'size':<9}{'capture':>9}{'region':>8}{'thumb':>8}{'peak MB':>9}"
+    header += "".join(f"{name:>16}" for name in encodings)
+    print(header)
+    for size_name, entry in results.items():
+        row = (f"{size_name:<9}{entry['capture_ms']:>9.1f}{entry['region_ms']:>8.1f}"
+               f"{entry['thumbnail_ms']:>8.1f}{entry['peak_mb']:>9.1f}")
+        for name in encodings:
+            enc = entry["encode"][name]
+            row += f"{enc['ms']:>8.0f}ms{enc['bytes'] / 1024:>5.0f}K"
+        print(row)
+    print("(times are medians in ms; encode columns are time and output size)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=list(ENCODINGS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a JSON baseline")
+    parser.add_argument("--peak-child", metavar="WxH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.peak_child:
+        size = tuple(int(n) for n in args.peak_child.lower().split("x"))
+        print(json.dumps({"peak_mb": measure_peak(size)}))
+        return
+
+    encodings = {name: ENCODINGS[name] for name in args.encodings}
+    results = {}
+    for name in args.sizes:
+        print(f"[bench] {name} ...", file=sys.stderr)
+        results[name] = bench_size(SIZES[name], encodings, args.runs)
+    report = {"meta": machine_info(args.runs), "runs": args.runs, "results": results}
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(report, baseline)
+        if regressed:
+            print(f"FAIL: {len(regressed)} metric(s) regressed")
+            sys.exit(1)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Thumbnail latency: single full-frame LANCZOS resize vs reduce-then-resample.
+
+Run from the repository root:
+    python benchmarks/bench_thumbnail.py [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+from src.it_agent.capture import synthetic_frame  # noqa: E402
+from src.it_agent.screenshot import THUMBNAIL_HEIGHT, image_to_thumbnail  # noqa: E402
+
+SIZES = {
+    "1080p": (1920, 1080),
+    "4K": (3840, 2160),
+    "3x1440p": (7680, 1440),
+}
+
+
+def single_lanczos(img, max_height=THUMBNAIL_HEIGHT):
+    width = int(img.width * max_height / img.height)
+    return img.resize((width, max_height), Image.LANCZOS)
+
+
+def time_ms(func, img, runs):
+    func(img)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(img)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'capture':<10}{'size':>12}{'lanczos ms':>13}{'reduce ms':>12}{'speedup':>10}")
+    for name, size in SIZES.items():
+        img = synthetic_frame(size)
+        old = time_ms(single_lanczos, img, args.runs)
+        new = time_ms(image_to_thumbnail, img, args.runs)
+        print(f"{name:<10}{size[0]:>6}x{size[1]:<5}{old:>13.1f}{new:>12.1f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Email resolver check: source order, caching per username|SID, TTL and negative TTL.
+
+Drives EmailResolver with fake sources and a temporary cache file, so
+it runs on any platform without touching the real user's identity, and
+exits non-zero on the first failed expectation.
+
+Run from the repository root:
+    python benchmarks/check_identity.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.it_agent.identity import EmailCache, EmailResolver, EmailSource, default_sources  # noqa: E402
+
+
+class FakeSource(EmailSource):
+    """Returns a fixed answer (or raises it, if it is an exception) and counts calls."""
+
+    def __init__(self, name, answer, in_process=True):
+        self.name = name
+        self.answer = answer
+        self.in_process = in_process
+        self.calls = 0
+
+    def resolve(self, username):
+        self.calls += 1
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+failures = []
+
+
+def expect(label, actual, wanted):
+    ok = actual == wanted
+    print(f"{'ok  ' if ok else 'FAIL'} {label}: {actual!r}" + ("" if ok else f" (wanted {wanted!r})"))
+    if not ok:
+        failures.append(label)
+
+
+def resolver(path, *sources, ttl=3600, negative_ttl=3600):
+    return EmailResolver(sources, EmailCache(path, ttl=ttl, negative_ttl=negative_ttl))
+
+
+def main():
+    tmp = tempfile.mkdtemp(prefix="ocp-identity-")
+    path = lambda name: os.path.join(tmp, name)  # noqa: E731
+
+    kinds = [s.in_process for s in default_sources()]
+    expect("default sources: in-process first", kinds, sorted(kinds, reverse=True))
+
+    broken = FakeSource("broken", OSError("no registry"))
+    invalid = FakeSource("invalid", "not an email")
+    first = FakeSource("first", " user@example.com ")
+    later = FakeSource("later", "other@example.com")
+    r = resolver(path("priority.json"), broken, invalid, first, later)
+    expect("first valid answer wins, stripped", r.resolve("user", "S-1"), "user@example.com")
+    expect("sources after the answer not called", later.calls, 0)
+
+    expect("cache hit", r.resolve("user", "S-1"), "user@example.com")
+    expect("cache hit skips sources", first.calls, 1)
+    expect("other SID is a miss", r.resolve("user", "S-2"), "user@example.com")
+    expect("miss queries sources again", first.calls, 2)
+    reloaded = resolver(path("priority.json"), FakeSource("unused", "x@example.com"))
+    expect("hit survives a restart", reloaded.resolve("user", "S-1"), "user@example.com")
+
+    none = FakeSource("none", None)
+    r = resolver(path("negative.json"), none)
+    expect("no answer gives empty email", r.resolve("user", "S-1"), "")
+    r.resolve("user", "S-1")
+    expect("negative answer cached", none.calls, 1)
+
+    expiring = FakeSource("expiring", "user@example.com")
+    r = resolver(path("ttl.json"), expiring, ttl=-1)
+    r.resolve("user", "S-1")
+    r.resolve("user", "S-1")
+    expect("expired positive entry re-resolved", expiring.calls, 2)
+
+    none = FakeSource("none", None)
+    r = resolver(path("negative-ttl.json"), none, negative_ttl=-1)
+    r.resolve("user", "S-1")
+    r.resolve("user", "S-1")
+    expect("expired negative entry re-resolved", none.calls, 2)
+
+    if failures:
+        print(f"FAIL: {len(failures)} check(s) failed")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Screenshot pipeline memory check: peak RSS and what survives a closed ticket.
+
+Runs several capture -> thumbnail -> encode -> multipart -> close cycles
+on a synthetic multi-monitor frame (no display or network needed) and
+exits non-zero if peak RSS grows past its limit, if more than one
+capture is held while a ticket is open, or if anything is left once it
+is closed. Retention is checked by counting live frames, attachments
+and large images and by tracemalloc, not by RSS, which depends on what
+the allocator hands back to the OS.
+
+Run from the repository root:
+    python benchmarks/check_memory.py [--size 7680x1440] [--tickets 3]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["OCP_CAPTURE_BACKEND"] = "synthetic"
+
+import psutil  # noqa: E402
+from PIL import Image  # noqa: E402
+from src.it_agent.attachments import AttachmentBuffer  # noqa: E402
+from src.it_agent.capture import BACKENDS, held_frames  # noqa: E402
+from src.it_agent.multipart import MultipartEncoder  # noqa: E402
+from src.it_agent.screenshot import capture_screenshot  # noqa: E402
+
+MB = 1024 * 1024
+
+
+class PeakRSS:
+    """Samples this process's RSS on a background thread and keeps the maximum."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+        self._proc = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._proc.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def ticket_cycle(mode):
+    """One F8 -> submit -> close round trip, minus the window and the network.
+
+    Returns (upload body size, frames held while the ticket was open).
+    """
+    job, frame = capture_screenshot(mode)
+    attachments = job.result()
+    held = len(held_frames())
+    encoder = MultipartEncoder([("subject", "memory check")], attachments)
+    for _chunk in encoder:
+        pass
+    body_size = encoder.total
+    encoder.close()
+    job.close()
+    frame.release()
+    return body_size, held
+
+
+def rss():
+    gc.collect()
+    return psutil.Process().memory_info().rss
+
+
+def leftovers(min_pixels):
+    """Frames, open attachments and images of at least `min_pixels` still alive.
+
+    The synthetic backend's template image (reused for every capture) is
+    not counted.
+    """
+    gc.collect()
+    objects = gc.get_objects()
+    template = {id(img) for img in BACKENDS["synthetic"]._frames.values()}
+    return {
+        "frames": len(held_frames()),
+        "attachments": sum(1 for o in objects if isinstance(o, AttachmentBuffer) and not o.closed),
+        "images": sum(1 for o in objects if isinstance(o, Image.Image) and id(o) not in template
+                      and o.width * o.height >= min_pixels),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="7680x1440", help="synthetic desktop size, WxH")
+    parser.add_argument("--mode", default="all", choices=("window", "monitor", "all"))
+    parser.add_argument("--tickets", type=int, default=3)
+    parser.add_argument("--peak-factor", type=float, default=2.0,
+                        help="max peak growth, in multiples of the frame's RGBX size")
+    parser.add_argument("--retained-kb", type=float, default=256.0,
+                        help="max Python heap (tracemalloc) left after all tickets are closed")
+    args = parser.parse_args()
+
+    width, height = (int(n) for n in args.size.lower().split("x"))
+    BACKENDS["synthetic"].size = (width, height)
+    frame_mb = width * height * 4 / MB
+
+    ticket_cycle(args.mode)
+    baseline = rss()
+    with PeakRSS() as peak:
+        held = max(ticket_cycle(args.mode)[1] for _ in range(args.tickets))
+
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(args.tickets):
+        body = ticket_cycle(args.mode)[0]
+    gc.collect()
+    retained_kb = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    left = leftovers(width * height // 16)
+
+    peak_growth = (peak.peak - baseline) / MB
+    peak_limit = frame_mb * args.peak_factor
+    print(f"frame {width}x{height} ({frame_mb:.0f} MB RGBX), upload body {body / MB:.1f} MB")
+    print(f"baseline RSS  {baseline / MB:8.1f} MB")
+    print(f"peak growth   {peak_growth:8.1f} MB  (limit {peak_limit:.0f} MB)")
+    print(f"held frames   {held:8d}     while a ticket is open (limit 1)")
+    print(f"retained heap {retained_kb:8.1f} KB  (limit {args.retained_kb:.0f} KB)")
+    print(f"left alive    {', '.join(f'{n} {k}' for k, n in left.items())}")
+
+    failed = []
+    if peak_growth > peak_limit:
+        failed.append("peak")
+    if held > 1:
+        failed.append("held frames")
+    if retained_kb > args.retained_kb:
+        failed.append("retained heap")
+    if any(left.values()):
+        failed.append("left alive")
+    if failed:
+        print(f"FAIL: {', '.join(failed)} over limit")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
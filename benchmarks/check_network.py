@@ -0,0 +1,165 @@
+"""Network identity check: public IP resolver against a local stand-in, and change detection.
+
+The resolver is pointed at a local http.server instead of the real
+lookup services, and NetworkIdentity polls a faked psutil interface
+table and default route, so this runs offline on any platform. Exits
+non-zero on the first failed expectation.
+
+Run from the repository root:
+    python benchmarks/check_network.py
+"""
+
+import http.server
+import os
+import socket
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.it_agent import network  # noqa: E402
+from src.it_agent.network import NetworkIdentity, PublicIPResolver  # noqa: E402
+
+failures = []
+
+
+def expect(label, actual, wanted):
+    ok = actual == wanted
+    print(f"{'ok  ' if ok else 'FAIL'} {label}: {actual!r}" + ("" if ok else f" (wanted {wanted!r})"))
+    if not ok:
+        failures.append(label)
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """Answers GET /ip with server.answer after server.delay seconds; anything else is a 404."""
+
+    def do_GET(self):
+        self.server.hits += 1
+        time.sleep(self.server.delay)
+        if self.path != "/ip":
+            self.send_error(404)
+            return
+        body = self.server.answer.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def stand_in():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.hits, server.delay, server.answer = 0, 0.0, "203.0.113.7"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def check_resolver():
+    server, base = stand_in()
+    resolver = PublicIPResolver([f"{base}/missing", f"{base}/ip"], ttl=3600, timeout=2)
+    expect("fetch falls through to the next URL", resolver.fetch(), "203.0.113.7")
+
+    server.delay = 0.5
+    resolver = PublicIPResolver([f"{base}/ip"], ttl=3600, timeout=2)
+    start = time.perf_counter()
+    first = resolver.get()
+    expect("get() does not wait for the lookup", first == "N/A" and time.perf_counter() - start < 0.2, True)
+    expect("lookup lands in the background", wait_for(lambda: resolver.get() == "203.0.113.7"), True)
+
+    server.delay = 0.0
+    hits = server.hits
+    resolver.get()
+    time.sleep(0.1)
+    expect("fresh value served from cache", server.hits, hits)
+
+    resolver.ttl = 0
+    server.answer = "203.0.113.8"
+    resolver.get()
+    expect("expired value refreshed", wait_for(lambda: resolver.get() == "203.0.113.8"), True)
+
+    resolver.ttl = 3600
+    resolver.invalidate()
+    expect("invalidate() forgets the value", resolver.get(), "N/A")
+    wait_for(lambda: resolver.get() != "N/A")
+
+    server.delay = 0.5
+    server.answer = "198.51.100.1"
+    resolver.invalidate()
+    resolver.refresh()
+    time.sleep(0.1)
+    server.delay = 0.0
+    server.answer = "198.51.100.2"
+    resolver.invalidate()
+    resolver.refresh()
+    expect("lookup after invalidate() wins", wait_for(lambda: resolver.get() == "198.51.100.2"), True)
+    time.sleep(0.6)
+    expect("lookup started before invalidate() is discarded", resolver.get(), "198.51.100.2")
+    server.shutdown()
+
+
+class FakePsutil:
+    """Stands in for the psutil calls NetworkIdentity makes."""
+
+    def __init__(self):
+        self.addresses = {"Ethernet": ["10.0.0.5"]}
+
+    def net_if_addrs(self):
+        return {name: [SimpleNamespace(family=socket.AF_INET, address=a) for a in addrs]
+                for name, addrs in self.addresses.items()}
+
+    def net_if_stats(self):
+        return {name: SimpleNamespace(isup=True) for name in self.addresses}
+
+
+def check_change_detection():
+    fake = FakePsutil()
+    route = {"value": ("Ethernet", "10.0.0.1")}
+    real_psutil, real_gateway = network.psutil, network._default_gateway
+    network.psutil = fake
+    network._default_gateway = lambda: route["value"]
+    identity = NetworkIdentity(poll_interval=0.05)
+    changes = []
+    identity.add_listener(changes.append)
+    try:
+        expect("initial gateway", identity.snapshot()["default_gateway"], "10.0.0.1")
+        identity.start()
+        time.sleep(0.2)
+        expect("no change, no notification", len(changes), 0)
+
+        fake.addresses = {"Ethernet": ["10.0.0.9"]}
+        expect("address change notified", wait_for(lambda: len(changes) == 1), True)
+        expect("snapshot rebuilt", changes[-1]["interfaces"][0]["ipv4"], ["10.0.0.9"])
+
+        route["value"] = ("Ethernet", "10.0.0.254")
+        expect("gateway change on the same address notified", wait_for(lambda: len(changes) == 2), True)
+        expect("new gateway served", identity.snapshot()["default_gateway"], "10.0.0.254")
+    finally:
+        identity.stop()
+        network.psutil, network._default_gateway = real_psutil, real_gateway
+
+
+def main():
+    check_resolver()
+    check_change_detection()
+
+    if failures:
+        print(f"FAIL: {len(failures)} check(s) failed")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
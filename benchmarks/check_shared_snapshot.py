@@ -0,0 +1,176 @@
+"""Shared snapshot check: publish/read round trip, seqlock under a racing writer, resize.
+
+Uses a plain mmap file in a temporary directory, so it runs the same on
+Linux and Windows without the service. Exits non-zero on the first
+failed expectation.
+
+Run from the repository root:
+    python benchmarks/check_shared_snapshot.py [--seconds 3]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.it_agent import shared_snapshot  # noqa: E402
+from src.it_agent.shared_snapshot import OFF_SEQ, SnapshotPublisher, SnapshotReader, _U64  # noqa: E402
+
+failures = []
+
+
+def expect(label, ok, detail=""):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(label)
+
+
+def document(n):
+    """A payload whose fields can be checked against each other, with a size that varies."""
+    return {"n": n, "pad": "x" * (n % 700), "check": n * 7}
+
+
+def consistent(data):
+    return data["check"] == data["n"] * 7 and len(data["pad"]) == data["n"] % 700
+
+
+def writer(path, seconds, slot_size):
+    publisher = SnapshotPublisher(path, slot_size)
+    n = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        n += 1
+        publisher.publish(document(n))
+    publisher.close()
+
+
+def check_round_trip(tmp):
+    path = os.path.join(tmp, "round-trip.snap")
+    publisher = SnapshotPublisher(path, 1024)
+    reader = SnapshotReader(path)
+    expect("empty file reads as nothing", reader.read() == (None, 0.0))
+    publisher.publish({"hostname": "pc-1", "ram": 16})
+    data, published_at = reader.read()
+    expect("round trip", data == {"hostname": "pc-1", "ram": 16}, repr(data))
+    expect("published_at set", abs(published_at - time.time()) < 60)
+    publisher.publish({"hostname": "pc-2"})
+    expect("second publish replaces the first", reader.read()[0] == {"hostname": "pc-2"})
+    reader.close()
+    publisher.close()
+
+
+def check_in_progress(tmp):
+    """A reader that finds a publish in progress (odd sequence) returns nothing rather than a torn slot."""
+    path = os.path.join(tmp, "in-progress.snap")
+    publisher = SnapshotPublisher(path, 1024)
+    publisher.publish({"n": 1})
+    seq = _U64.unpack_from(publisher._mm, OFF_SEQ)[0]
+    _U64.pack_into(publisher._mm, OFF_SEQ, seq + 1)
+    reader = SnapshotReader(path, retries=5)
+    expect("odd sequence gives up after its retries", reader.read() == (None, 0.0))
+    _U64.pack_into(publisher._mm, OFF_SEQ, seq + 2)
+    expect("even sequence reads again", reader.read()[0] == {"n": 1})
+    reader.close()
+    publisher.close()
+
+
+def check_lapped(tmp):
+    """The writer publishes twice while the reader is copying a slot: the seqlock must catch it and retry.
+
+    The reader decodes the slot with str(); a module-level str that
+    publishes first stands in for a writer that laps a slow reader.
+    """
+    path = os.path.join(tmp, "lapped.snap")
+    publisher = SnapshotPublisher(path, 1024)
+    publisher.publish(document(1))
+    reader = SnapshotReader(path)
+    laps = []
+
+    def lapping_str(obj, *args):
+        if not laps:
+            laps.append(True)
+            publisher.publish(document(2))
+            publisher.publish(document(3))
+        return str(obj, *args)
+
+    shared_snapshot.str = lapping_str
+    try:
+        data, _ = reader.read()
+    finally:
+        del shared_snapshot.str
+    expect("reader lapped mid-copy retries and gets the latest", data == document(3),
+           repr(data)[:60])
+    reader.close()
+    publisher.close()
+
+
+def check_race(tmp, seconds):
+    """Read continuously while another process publishes as fast as it can."""
+    path = os.path.join(tmp, "race.snap")
+    SnapshotPublisher(path, 1024).close()
+    proc = multiprocessing.Process(target=writer, args=(path, seconds, 1024))
+    proc.start()
+    reader = SnapshotReader(path, retries=1000)
+    reads = torn = empty = backwards = 0
+    last = 0
+    while proc.is_alive():
+        data, _ = reader.read()
+        reads += 1
+        if data is None:
+            empty += 1
+            continue
+        if not consistent(data):
+            torn += 1
+        if data["n"] < last:
+            backwards += 1
+        last = data["n"]
+    proc.join()
+    reader.close()
+    expect("no torn reads under a racing writer", torn == 0,
+           f"{reads} reads, {torn} torn, {empty} empty, last publish seen {last}")
+    expect("reads never go back in time", backwards == 0)
+    expect("reader saw the writer's publishes", last > 0)
+
+
+def check_resize(tmp):
+    """A reader mapped before the publisher restarts with a bigger slot re-opens the file."""
+    path = os.path.join(tmp, "resize.snap")
+    publisher = SnapshotPublisher(path, 1024)
+    publisher.publish({"n": 1})
+    reader = SnapshotReader(path)
+    expect("read before resize", reader.read()[0] == {"n": 1})
+    publisher.close()
+
+    publisher = SnapshotPublisher(path, 8192)
+    big = {"n": 2, "pad": "y" * 5000}
+    publisher.publish(big)
+    expect("read after resize re-opens the file", reader.read()[0] == big)
+    expect("file grew", os.path.getsize(path) > 2 * 8192)
+    reader.close()
+    publisher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0, help="length of the racing-writer check")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ocp-snapshot-")
+    check_round_trip(tmp)
+    check_in_progress(tmp)
+    check_lapped(tmp)
+    check_race(tmp, args.seconds)
+    check_resize(tmp)
+
+    if failures:
+        print(f"FAIL: {len(failures)} check(s) failed")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,7 @@ class ITAgentApp(ctk.CTk):
             pass
 
         self._ticket_window = None
+        self._ticket_token = None
         self._tray = TrayManager(self)
 
         self.after(500, self._start_background)
@@ -57,13 +58,42 @@ class ITAgentApp(ctk.CTk):
         print("[OCP IT Helpdesk] Running in background. Press F8 to open a support ticket.")
         print("[OCP IT Helpdesk] Right-click the system tray icon to quit.")
 
-    def open_ticket_window(self, sysinfo, screenshot_buf, screenshot_img):
-        """Open the ticket window (called from the hotkey/tray thread via .after)."""
-        if self._ticket_window is not None and self._ticket_window.winfo_exists():
+    def ticket_window_open(self):
+        """True while a ticket window is showing (Tk thread only)."""
+        return self._ticket_window is not None and self._ticket_window.winfo_exists()
+
+    def focus_ticket_window(self):
+        if self.ticket_window_open():
+            self._ticket_window.focus_force()
+
+    def open_ticket_window(self, sysinfo, screenshot_job, screenshot_frame, replay_job=None, token=None):
+        """Open the ticket window (called from the hotkey/tray thread via .after).
+
+        `token` identifies this press; sysinfo updates carrying another
+        press's token are dropped, so a second F8 cannot overwrite the
+        open ticket's fields.
+        """
+        if self.ticket_window_open():
+            for job in (screenshot_job, replay_job):
+                if job is not None:
+                    job.close()
+            if screenshot_frame is not None:
+                screenshot_frame.release()
             self._ticket_window.focus_force()
             return
 
-        self._ticket_window = TicketWindow(self, sysinfo, screenshot_buf, screenshot_img)
+        self._ticket_window = TicketWindow(self, sysinfo, screenshot_job, screenshot_frame, replay_job)
+        self._ticket_token = token
+
+    def update_ticket_info(self, key, value, token=None):
+        """Forward one collected sysinfo field to the ticket window it was collected for."""
+        if token is self._ticket_token and self.ticket_window_open():
+            self._ticket_window.set_info_field(key, value)
+
+    def complete_ticket_info(self, sysinfo, token=None):
+        """Forward the final sysinfo dict to the ticket window it was collected for."""
+        if token is self._ticket_token and self.ticket_window_open():
+            self._ticket_window.set_info_complete(sysinfo)
 
     def quit_app(self):
         """Gracefully shut down the application."""
@@ -29,6 +29,7 @@ build_exe_options = {
         "platform",
         "ctypes",
         "json",
+        "sqlite3",
         "win32serviceutil",
         "win32service",
         "win32event",
@@ -46,6 +47,24 @@ build_exe_options = {
     "includes": [
         "src.it_agent",
         "src.it_agent.sysinfo",
+        "src.it_agent.collector",
+        "src.it_agent.snapshot",
+        "src.it_agent.sampler",
+        "src.it_agent.identity",
+        "src.it_agent.paths",
+        "src.it_agent.network",
+        "src.it_agent.telemetry",
+        "src.it_agent.processes",
+        "src.it_agent.disks",
+        "src.it_agent.shared_snapshot",
+        "src.it_agent.capture",
+        "src.it_agent.attachments",
+        "src.it_agent.replay",
+        "src.it_agent.http_client",
+        "src.it_agent.spool",
+        "src.it_agent.metadata",
+        "src.it_agent.multipart",
+        "src.it_agent.resilience",
         "src.it_agent.screenshot",
         "src.it_agent.gui",
         "src.it_agent.tray",
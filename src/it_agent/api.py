@@ -3,6 +3,14 @@
 import requests
 import json
 import os
+import uuid
+from src.it_agent.http_client import get_client
+from src.it_agent.metadata import MetadataCache
+from src.it_agent.multipart import MultipartEncoder, UploadCancelled
+from src.it_agent.resilience import CircuitOpen, RetryPolicy, get_breaker, get_metrics, parse_retry_after
+from src.it_agent.spool import get_spool
+from src.it_agent.processes import format_table as format_process_table
+from src.it_agent.disks import format_table as format_volume_table
 
 HAPPYFOX_ENDPOINT = os.environ.get(
     "HAPPYFOX_ENDPOINT",
@@ -13,7 +21,17 @@ HAPPYFOX_AUTH_CODE = os.environ.get("HAPPYFOX_AUTH_CODE", "")
 
 HAPPYFOX_CATEGORY_NAME = os.environ.get("HAPPYFOX_CATEGORY", "Helpdesk - Colorado")
 
-_category_id_cache = None
+SENT = "sent"
+RETRY = "retry"
+FAILED = "failed"
+CANCELLED = "cancelled"
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+REPEATABLE_STATUS = {408, 429, 502, 503, 504}
+RETRY_POLICY = RetryPolicy()
+
+DEFAULT_CATEGORY_ID = 1
+
+_metadata = None
 
 
 def _get_base_url():
@@ -23,47 +41,77 @@ def _get_base_url():
     return endpoint.rsplit("/", 1)[0] if "/" in endpoint else endpoint
 
 
+def get_metadata():
+    """Return the shared HappyFox metadata cache for the configured endpoint."""
+    global _metadata
+    if _metadata is None:
+        _metadata = MetadataCache(_get_base_url(), auth=(HAPPYFOX_API_KEY, HAPPYFOX_AUTH_CODE))
+    return _metadata
+
+
 def _fetch_category_id():
-    global _category_id_cache
-    if _category_id_cache is not None:
-        return _category_id_cache
+    """Category ID for HAPPYFOX_CATEGORY from the metadata cache, never waiting on the network.
+
+    Until the category list has been fetched (or if the name is not in
+    it) DEFAULT_CATEGORY_ID is used.
+    """
+    category_id = get_metadata().lookup_id("categories", HAPPYFOX_CATEGORY_NAME)
+    if category_id is None:
+        print(f"[API] Category '{HAPPYFOX_CATEGORY_NAME}' not known yet; using {DEFAULT_CATEGORY_ID}.")
+        return DEFAULT_CATEGORY_ID
+    return category_id
 
-    try:
-        base_url = _get_base_url()
-        categories_url = f"{base_url}/categories/"
-        response = requests.get(
-            categories_url,
-            auth=(HAPPYFOX_API_KEY, HAPPYFOX_AUTH_CODE),
-            timeout=15,
-        )
-        if response.status_code == 200:
-            categories = response.json()
-            for cat in categories:
-                if cat.get("name", "").strip().lower() == HAPPYFOX_CATEGORY_NAME.strip().lower():
-                    _category_id_cache = cat["id"]
-                    return _category_id_cache
-    except Exception:
-        pass
 
-    return 1
+def prewarm():
+    """Open the pooled HappyFox connection in the background, ahead of send_ticket()."""
+    get_client().prewarm(HAPPYFOX_ENDPOINT, auth=(HAPPYFOX_API_KEY, HAPPYFOX_AUTH_CODE))
 
 
-def send_ticket(data, screenshot_bytes=None):
+def send_ticket(data, attachments=None, on_progress=None, cancel=None):
     """Submit an IT support ticket to HappyFox.
     
     The ticket is created on behalf of the currently logged-in user.
     Tickets are routed to the "Helpdesk - Colorado" category by default.
     Override with the HAPPYFOX_CATEGORY environment variable.
+
+    If HappyFox cannot be reached (connection error, timeout, 429 or 5xx)
+    the ticket and its attachments are written to the offline spool and
+    sent later by its drainer; that also counts as success. A cancelled
+    upload is neither sent nor spooled.
     
     Args:
         data: dict with keys: subject, description, priority, name, email,
               hostname, local_ip, public_ip, mac_address, cpu_usage,
               ram_usage, disk_usage, os_info, active_window
-        screenshot_bytes: BytesIO buffer with PNG screenshot, or None
+        attachments: list of AttachmentBuffer (encoded screenshots), or None
+        on_progress: called as on_progress(sent, total) bytes while uploading
+        cancel: threading.Event; setting it aborts the upload
     
     Returns:
         (success: bool, message: str)
     """
+    data.setdefault("ticket_ref", uuid.uuid4().hex)
+    outcome, message = post_ticket(data, attachments, on_progress, cancel)
+    if outcome != RETRY:
+        return outcome == SENT, message
+    try:
+        get_spool().add(data["ticket_ref"], data, attachments or ())
+    except Exception as e:
+        print(f"[API] Could not spool ticket: {e}")
+        return False, message
+    print(f"[API] HappyFox unreachable ({message}); ticket {data['ticket_ref']} spooled.")
+    return True, "HappyFox is unreachable right now. Your ticket was saved and will be sent automatically."
+
+
+def post_ticket(data, attachments=None, on_progress=None, cancel=None):
+    """Submit once through the endpoint's circuit breaker, streaming the attachments.
+
+    Transient failures that are safe to repeat are retried inline per
+    RETRY_POLICY (full-jitter backoff, or the server's Retry-After if it
+    is short enough); while the breaker is open the call fails fast.
+    Returns (outcome, message) where outcome is SENT, RETRY (worth trying
+    again later), FAILED (rejected; resending will not help) or CANCELLED.
+    """
     priority_map = {"Low": 1, "Medium": 2, "High": 3}
 
     user_name = data.get("name", data.get("username", "User"))
@@ -72,7 +120,7 @@ def send_ticket(data, screenshot_bytes=None):
     if not user_email or "@" not in user_email:
         user_email = os.environ.get("HAPPYFOX_DEFAULT_EMAIL", "")
     if not user_email:
-        return False, "Could not determine your email address. Please contact IT support directly."
+        return FAILED, "Could not determine your email address. Please contact IT support directly."
 
     category_id = _fetch_category_id()
 
@@ -84,31 +132,97 @@ def send_ticket(data, screenshot_bytes=None):
         "email": user_email,
         "category": category_id,
     }
+    encoder = MultipartEncoder(body.items(), attachments or (), on_progress=on_progress, cancel=cancel)
+    headers = {"Content-Type": encoder.content_type}
+    if data.get("ticket_ref"):
+        headers["Idempotency-Key"] = data["ticket_ref"]
+
+    breaker = get_breaker(HAPPYFOX_ENDPOINT)
+    metrics = get_metrics()
+    retry_after = None
+    try:
+        for attempt in range(RETRY_POLICY.attempts):
+            if attempt:
+                delay = RETRY_POLICY.delay(attempt, retry_after)
+                if delay > RETRY_POLICY.max_wait:
+                    break
+                metrics.count("retries", HAPPYFOX_ENDPOINT)
+                print(f"[API] {message} Retrying in {delay:.1f}s ({attempt}/{RETRY_POLICY.attempts - 1}).")
+                if encoder.cancel.wait(delay):
+                    return CANCELLED, "Upload cancelled."
+                encoder.seek(0)
+            try:
+                breaker.check()
+            except CircuitOpen as e:
+                metrics.count("fail_fast", HAPPYFOX_ENDPOINT)
+                return RETRY, f"HappyFox is unavailable; next attempt in {e.retry_in:.0f}s."
+
+            metrics.count("attempts", HAPPYFOX_ENDPOINT)
+            outcome, message, retry_after, repeatable = _post_once(encoder, headers, breaker)
+            if outcome != RETRY or not repeatable:
+                break
+        if outcome == RETRY:
+            metrics.count("failures", HAPPYFOX_ENDPOINT)
+        return outcome, message
+    finally:
+        encoder.close()
+
 
-    files = None
-    if screenshot_bytes is not None:
-        screenshot_bytes.seek(0)
-        files = [("attachments", ("screenshot.png", screenshot_bytes, "image/png"))]
+def _post_once(encoder, headers, breaker):
+    """One POST of the ticket body, recording the result on `breaker`.
 
+    Returns (outcome, message, retry_after, repeatable): `repeatable` is
+    true when resending at once is safe, i.e. the server cannot have
+    acted on the request (the connection failed, or the status says it
+    was not processed). A read timeout or a 500 may have created the
+    ticket, so those are left to the spool, which resends with the same
+    Idempotency-Key. Any answer other than a retryable status counts as
+    the endpoint being up.
+    """
     try:
-        response = requests.post(
+        response = get_client().post(
             HAPPYFOX_ENDPOINT,
             auth=(HAPPYFOX_API_KEY, HAPPYFOX_AUTH_CODE),
-            data=body,
-            files=files,
-            timeout=30,
+            data=encoder,
+            headers=headers,
         )
-
-        if response.status_code in (200, 201):
-            return True, "Ticket submitted successfully!"
-        else:
-            return False, f"Server returned status {response.status_code}: {response.text[:200]}"
+    except UploadCancelled:
+        return CANCELLED, "Upload cancelled.", None, False
     except requests.exceptions.ConnectionError:
-        return False, "Connection error. Check your network and HappyFox endpoint URL."
+        breaker.record_failure()
+        return RETRY, "Connection error. Check your network and HappyFox endpoint URL.", None, True
     except requests.exceptions.Timeout:
-        return False, "Request timed out. Please try again."
+        breaker.record_failure()
+        return RETRY, "Request timed out. Please try again.", None, False
     except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+        return FAILED, f"Unexpected error: {str(e)}", None, False
+
+    message = f"Server returned status {response.status_code}: {response.text[:200]}"
+    if response.status_code in RETRYABLE_STATUS:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        breaker.record_failure(retry_after)
+        return RETRY, message, retry_after, response.status_code in REPEATABLE_STATUS
+    breaker.record_success()
+    if response.status_code in (200, 201):
+        return SENT, "Ticket submitted successfully!", None, False
+    return FAILED, message, None, False
+
+
+def tickets_retry_in():
+    """Seconds until the ticket endpoint may be tried again (0 when it is up or untested)."""
+    return get_breaker(HAPPYFOX_ENDPOINT).retry_in()
+
+
+def endpoint_status():
+    """Circuit-breaker state of the ticket endpoint: {"state", "failures", "retry_in"}."""
+    return get_breaker(HAPPYFOX_ENDPOINT).snapshot()
+
+
+def _pct(value):
+    """Format a percentage, leaving markers such as "Timed out" untouched."""
+    if isinstance(value, (int, float)):
+        return f"{value}%"
+    return str(value)
 
 
 def _build_description(data):
@@ -121,15 +235,44 @@ def _build_description(data):
         f"Username: {data.get('username', 'N/A')}\n"
         f"Local IP: {data.get('local_ip', 'N/A')}\n"
         f"Public IP: {data.get('public_ip', 'N/A')}\n"
+        f"Default Gateway: {data.get('default_gateway', 'N/A')}\n"
+        f"Interfaces: {data.get('network_interfaces', 'N/A')}\n"
         f"MAC Address: {data.get('mac_address', 'N/A')}\n"
         f"OS: {data.get('os_info', 'N/A')}\n"
-        f"CPU Usage: {data.get('cpu_usage', 'N/A')}%\n"
-        f"RAM Usage: {data.get('ram_usage', 'N/A')}% (Total: {data.get('total_ram', 'N/A')})\n"
+        f"CPU Usage: {_pct(data.get('cpu_usage', 'N/A'))} "
+        f"(1m avg: {_pct(data.get('cpu_avg_1m', 'N/A'))}, 5m peak: {_pct(data.get('cpu_peak_5m', 'N/A'))})\n"
+        f"RAM Usage: {_pct(data.get('ram_usage', 'N/A'))} (Total: {data.get('total_ram', 'N/A')}, "
+        f"5m peak: {_pct(data.get('ram_peak_5m', 'N/A'))})\n"
+        f"Swap Usage: {_pct(data.get('swap_usage', 'N/A'))}\n"
         f"Logical Processors: {data.get('logical_processors', 'N/A')}\n"
-        f"Disk Usage: {data.get('disk_usage', 'N/A')}%\n"
+        f"Disk Usage: {_pct(data.get('disk_usage', 'N/A'))}\n"
         f"Uptime: {data.get('uptime', 'N/A')}\n"
         f"Battery: {data.get('battery', 'N/A')}\n"
         f"Active Window: {data.get('active_window', 'N/A')}\n"
+        f"Screen Capture: {data.get('screen_capture', 'N/A')}\n"
     )
 
+    if data.get("screenshot_encoding"):
+        system_block += f"Screenshot Encoding: {data['screenshot_encoding']}\n"
+    if data.get("spool_note"):
+        system_block += f"Offline Spool: {data['spool_note']}\n"
+    if data.get("ticket_ref"):
+        system_block += f"Reference: {data['ticket_ref']}\n"
+
+    volumes = data.get("volumes")
+    if isinstance(volumes, list) and volumes:
+        system_block += f"\n--- Volumes ---\n{format_volume_table(volumes)}"
+
+    top = data.get("top_processes")
+    if isinstance(top, dict):
+        system_block += f"\n--- Top Processes ---\n{format_process_table(top)}"
+
+    history = data.get("telemetry_summary")
+    if history and history != "Timed out":
+        system_block += f"\n--- Last Hour ---\n{history}"
+
+    timed_out = data.get("timed_out")
+    if timed_out:
+        system_block += f"Timed Out: {', '.join(timed_out)}\n"
+
     return user_desc + system_block
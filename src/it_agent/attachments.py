@@ -0,0 +1,85 @@
+"""Encoded ticket attachments lent out as read-only views instead of copies."""
+
+import io
+
+
+class AttachmentBuffer:
+    """Owns one encoded attachment and hands out read-only memoryviews of it.
+
+    The bytes live in a single BytesIO for the attachment's lifetime;
+    view() and reader() expose them without copying. close() releases
+    every outstanding view and then the buffer, so the memory is returned
+    as soon as the ticket is sent or discarded.
+    """
+
+    def __init__(self, buffer, filename, mime_type, params=None):
+        self._buffer = buffer
+        self.filename = filename
+        self.mime_type = mime_type
+        self.params = params or {}
+        self._views = []
+
+    @property
+    def closed(self):
+        return self._buffer is None
+
+    @property
+    def size(self):
+        return 0 if self._buffer is None else self._buffer.getbuffer().nbytes
+
+    def view(self):
+        """Return a read-only memoryview over the encoded bytes."""
+        if self._buffer is None:
+            raise ValueError("Attachment is closed")
+        view = self._buffer.getbuffer().toreadonly()
+        self._views.append(view)
+        return view
+
+    def reader(self):
+        """Return a binary file-like object reading from a view of the bytes."""
+        return ViewReader(self.view())
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ViewReader(io.RawIOBase):
+    """Sequential reader over a memoryview; readinto() copies straight into the caller's buffer."""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
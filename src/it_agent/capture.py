@@ -0,0 +1,609 @@
+"""Pluggable screen-capture backends with one-time calibration and automatic fallback."""
+
+import json
+import os
+import platform
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from PIL import Image, ImageDraw
+from src.it_agent.paths import user_data_dir
+
+CALIBRATION_FILE = "capture_backend.json"
+MAX_FAILURES = 3
+
+BACKENDS = {}
+_held_frames = weakref.WeakSet()
+
+
+def register_backend(backend):
+    """Add a backend instance to the registry under its name."""
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+@contextmanager
+def dpi_aware():
+    """Run the block with per-monitor DPI awareness so coordinates are physical pixels."""
+    user32 = None
+    old = None
+    if platform.system() == "Windows":
+        import ctypes
+        user32 = ctypes.windll.user32
+        if hasattr(user32, "SetThreadDpiAwarenessContext"):
+            user32.SetThreadDpiAwarenessContext.restype = ctypes.c_void_p
+            user32.SetThreadDpiAwarenessContext.argtypes = [ctypes.c_void_p]
+            old = user32.SetThreadDpiAwarenessContext(ctypes.c_void_p(-4))
+    try:
+        yield
+    finally:
+        if old:
+            user32.SetThreadDpiAwarenessContext(old)
+
+
+def virtual_origin():
+    """Top-left corner of the virtual desktop (negative if a monitor sits left of / above the primary)."""
+    if platform.system() != "Windows":
+        return 0, 0
+    import ctypes
+    with dpi_aware():
+        return ctypes.windll.user32.GetSystemMetrics(76), ctypes.windll.user32.GetSystemMetrics(77)
+
+
+def get_monitors():
+    """Return each monitor's (left, top, right, bottom) in virtual-desktop pixels; [] if unknown."""
+    if platform.system() != "Windows":
+        return []
+    import ctypes
+    from ctypes import wintypes
+
+    monitors = []
+    proc_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC,
+                                   ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+
+    def _callback(hmonitor, hdc, rect, lparam):
+        r = rect.contents
+        monitors.append((r.left, r.top, r.right, r.bottom))
+        return True
+
+    try:
+        user32 = ctypes.windll.user32
+        user32.EnumDisplayMonitors.argtypes = [wintypes.HDC, ctypes.c_void_p, proc_type, wintypes.LPARAM]
+        with dpi_aware():
+            user32.EnumDisplayMonitors(None, None, proc_type(_callback), 0)
+    except Exception as e:
+        print(f"[Capture] Monitor enumeration failed: {e}")
+        return []
+    return monitors
+
+
+def _intersect(a, b):
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+
+class Frame:
+    """One captured desktop, held once, from which regions are cut on demand.
+
+    A frame wraps either a raw top-down BGRX buffer (the GDI backend) or
+    a PIL Image. region() decodes only the requested rows and columns:
+    raw frames are sliced with a memoryview at the full stride, image
+    frames are cropped, so switching capture modes never copies the whole
+    desktop. Coordinates are virtual-desktop pixels; origin is the
+    desktop's top-left corner. Redaction boxes drawn by the user are kept
+    in the same coordinates so they survive capture-mode switches.
+
+    The pixels are held until release(): the ticket window keeps them
+    while it is open so modes can be re-cut and redactions re-encoded,
+    and only one ticket window exists at a time, so at most one frame's
+    pixels are held outside a capture in progress (see held_frames()).
+    """
+
+    def __init__(self, size, origin=(0, 0), image=None, buffer=None, stride=None):
+        self.size = tuple(size)
+        self.origin = tuple(origin)
+        self.window_rect = None
+        self.monitors = []
+        self.mode = None
+        self.thumbnail = None
+        self.redactions = []
+        self._img = image
+        self._buf = buffer
+        self.stride = stride
+        if not self.released:
+            _held_frames.add(self)
+
+    @classmethod
+    def from_image(cls, img, origin=(0, 0)):
+        return cls(img.size, origin, image=img)
+
+    @classmethod
+    def from_buffer(cls, buf, width, height, origin=(0, 0), stride=None):
+        return cls((width, height), origin, buffer=buf, stride=stride or width * 4)
+
+    @property
+    def released(self):
+        return self._img is None and self._buf is None
+
+    @property
+    def image(self):
+        """The current mode's region, cut on demand (None once released)."""
+        if self.released:
+            return None
+        return self.region(self.box_for(self.mode))
+
+    def release(self):
+        """Drop the captured pixels; only the thumbnail is kept."""
+        self._img = None
+        self._buf = None
+        _held_frames.discard(self)
+
+    @property
+    def bounds(self):
+        left, top = self.origin
+        return left, top, left + self.size[0], top + self.size[1]
+
+    def region(self, box=None):
+        """Return the part of the frame inside `box` (clipped) as a PIL Image."""
+        box = _intersect(box, self.bounds) if box else self.bounds
+        if box is None:
+            box = self.bounds
+        x, y = box[0] - self.origin[0], box[1] - self.origin[1]
+        w, h = box[2] - box[0], box[3] - box[1]
+        if self._buf is not None:
+            start = y * self.stride + x * 4
+            view = memoryview(self._buf)[start:start + (h - 1) * self.stride + w * 4]
+            return Image.frombuffer("RGB", (w, h), view, "raw", "BGRX", self.stride, 1)
+        if (x, y, w, h) == (0, 0) + self.size:
+            return self._img
+        return self._img.crop((x, y, x + w, y + h))
+
+    def box_for(self, mode):
+        """Bounding box for a capture mode: "window", "monitor" or "all"."""
+        if mode == "window" and self.window_rect:
+            return _intersect(self.window_rect, self.bounds) or self.bounds
+        if mode in ("window", "monitor") and self.monitors:
+            if self.window_rect:
+                cx = (self.window_rect[0] + self.window_rect[2]) // 2
+                cy = (self.window_rect[1] + self.window_rect[3]) // 2
+                for mon in self.monitors:
+                    if mon[0] <= cx < mon[2] and mon[1] <= cy < mon[3]:
+                        return mon
+            primary = [m for m in self.monitors if m[0] <= 0 < m[2] and m[1] <= 0 < m[3]]
+            return (primary or self.monitors)[0]
+        return self.bounds
+
+    def part_boxes(self, mode=None):
+        """Boxes to encode for `mode`: one per monitor for "all" on a multi-monitor desktop."""
+        mode = mode or self.mode
+        if mode == "all" and len(self.monitors) > 1:
+            boxes = [_intersect(mon, self.bounds) for mon in self.monitors]
+            return [box for box in boxes if box]
+        return [self.box_for(mode)]
+
+    def redactions_in(self, box):
+        """Redaction boxes overlapping `box`, clipped and relative to its top-left corner."""
+        boxes = []
+        for redaction in self.redactions:
+            hit = _intersect(redaction, box)
+            if hit:
+                boxes.append((hit[0] - box[0], hit[1] - box[1], hit[2] - box[0], hit[3] - box[1]))
+        return boxes
+
+    def select(self, mode):
+        """Switch to `mode`; its image is cut when next read from self.image."""
+        self.mode = mode
+        self.thumbnail = None
+
+
+def held_frames():
+    """Frames whose captured pixels are still alive (not released and not garbage)."""
+    return [frame for frame in list(_held_frames) if not frame.released]
+
+
+class CaptureBackend:
+    """Base class for screen-capture implementations.
+
+    Subclasses implement grab() returning a PIL Image of the whole
+    virtual desktop, or override grab_frame() to return a Frame directly.
+    capture() records latency and frame size so backends can be compared
+    across machines. A backend that only sees part of the desktop sets
+    full_desktop = False and is used only when no full one works. One
+    whose grab_scaled() shrinks while copying (never touching full
+    resolution) sets scales_natively and is preferred for small grabs.
+    """
+
+    name = "base"
+    calibrate = True
+    full_desktop = True
+    scales_natively = False
+
+    def __init__(self):
+        self.last_latency_ms = None
+        self.last_size = None
+        self.captures = 0
+        self.failures = 0
+
+    def available(self):
+        return True
+
+    def grab(self):
+        raise NotImplementedError
+
+    def grab_frame(self):
+        img = self.grab()
+        return Frame.from_image(img, virtual_origin()) if img is not None else None
+
+    def grab_scaled(self, max_height):
+        """Whole desktop no taller than `max_height`; not counted in the capture stats."""
+        img = self.grab()
+        factor = img.height // max_height
+        if factor > 1:
+            img = img.reduce(factor)
+        if img.height > max_height:
+            img = img.resize((max(1, img.width * max_height // img.height), max_height), Image.BILINEAR)
+        return img
+
+    def capture(self):
+        start = time.perf_counter()
+        try:
+            frame = self.grab_frame()
+        except Exception:
+            self.failures += 1
+            raise
+        if frame is None:
+            self.failures += 1
+            raise RuntimeError(f"{self.name} returned no image")
+        self.last_latency_ms = (time.perf_counter() - start) * 1000
+        self.last_size = frame.size
+        self.captures += 1
+        return frame
+
+    def stats(self):
+        return {
+            "latency_ms": None if self.last_latency_ms is None else round(self.last_latency_ms, 1),
+            "size": self.last_size,
+            "captures": self.captures,
+            "failures": self.failures,
+        }
+
+
+class ImageGrabBackend(CaptureBackend):
+    """PIL.ImageGrab across all monitors."""
+
+    name = "imagegrab"
+
+    def available(self):
+        try:
+            from PIL import ImageGrab  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def grab(self):
+        from PIL import ImageGrab
+        if platform.system() == "Windows":
+            return ImageGrab.grab(all_screens=True)
+        return ImageGrab.grab()
+
+
+class PyAutoGUIBackend(CaptureBackend):
+    """pyautogui.screenshot() (primary monitor only); imported lazily."""
+
+    name = "pyautogui"
+    full_desktop = False
+
+    def available(self):
+        import importlib.util
+        return importlib.util.find_spec("pyautogui") is not None
+
+    def grab(self):
+        import pyautogui
+        return pyautogui.screenshot()
+
+    def grab_frame(self):
+        return Frame.from_image(self.grab())
+
+
+class RawBufferBackend(CaptureBackend):
+    """GDI BitBlt of the virtual desktop into a 32-bit top-down DIB section (Windows)."""
+
+    name = "raw"
+    scales_natively = True
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+    HALFTONE = 4
+
+    def available(self):
+        return platform.system() == "Windows"
+
+    def grab_raw(self, max_height=None):
+        """Return (buffer, width, height, left, top); buffer is BGRX, stride width * 4.
+
+        With `max_height`, the desktop is shrunk by GDI (StretchBlt,
+        HALFTONE) while copying, so small frames never touch full resolution.
+        """
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        user32.GetDC.restype = wintypes.HDC
+        user32.GetDC.argtypes = [wintypes.HWND]
+        user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+        gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+        gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+        gdi32.CreateDIBSection.argtypes = [wintypes.HDC, ctypes.c_void_p, wintypes.UINT,
+                                           ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.DWORD]
+        gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                 wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        gdi32.StretchBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                     wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                     wintypes.DWORD]
+        gdi32.SetStretchBltMode.argtypes = [wintypes.HDC, ctypes.c_int]
+        gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        gdi32.DeleteDC.argtypes = [wintypes.HDC]
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [
+                ("biSize", wintypes.DWORD), ("biWidth", wintypes.LONG), ("biHeight", wintypes.LONG),
+                ("biPlanes", wintypes.WORD), ("biBitCount", wintypes.WORD),
+                ("biCompression", wintypes.DWORD), ("biSizeImage", wintypes.DWORD),
+                ("biXPelsPerMeter", wintypes.LONG), ("biYPelsPerMeter", wintypes.LONG),
+                ("biClrUsed", wintypes.DWORD), ("biClrImportant", wintypes.DWORD),
+            ]
+
+        with dpi_aware():
+            left = user32.GetSystemMetrics(76)
+            top = user32.GetSystemMetrics(77)
+            width = user32.GetSystemMetrics(78)
+            height = user32.GetSystemMetrics(79)
+            src_width, src_height = width, height
+            if max_height and height > max_height:
+                width, height = max(1, width * max_height // height), max_height
+
+            header = BITMAPINFOHEADER()
+            header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+            header.biWidth = width
+            header.biHeight = -height
+            header.biPlanes = 1
+            header.biBitCount = 32
+
+            hdc_screen = user32.GetDC(None)
+            hdc_mem = gdi32.CreateCompatibleDC(hdc_screen)
+            bits = ctypes.c_void_p()
+            hbmp = gdi32.CreateDIBSection(hdc_screen, ctypes.byref(header), 0, ctypes.byref(bits), None, 0)
+            old = gdi32.SelectObject(hdc_mem, hbmp)
+            try:
+                if (width, height) == (src_width, src_height):
+                    ok = gdi32.BitBlt(hdc_mem, 0, 0, width, height, hdc_screen, left, top,
+                                      self.SRCCOPY | self.CAPTUREBLT)
+                else:
+                    gdi32.SetStretchBltMode(hdc_mem, self.HALFTONE)
+                    ok = gdi32.StretchBlt(hdc_mem, 0, 0, width, height, hdc_screen, left, top,
+                                          src_width, src_height, self.SRCCOPY | self.CAPTUREBLT)
+                if not ok:
+                    raise OSError("BitBlt failed")
+                size = width * height * 4
+                buf = bytearray(size)
+                ctypes.memmove((ctypes.c_char * size).from_buffer(buf), bits, size)
+            finally:
+                gdi32.SelectObject(hdc_mem, old)
+                gdi32.DeleteObject(hbmp)
+                gdi32.DeleteDC(hdc_mem)
+                user32.ReleaseDC(None, hdc_screen)
+
+        return buf, width, height, left, top
+
+    def grab(self):
+        return self.grab_frame().region()
+
+    def grab_frame(self):
+        buf, width, height, left, top = self.grab_raw()
+        return Frame.from_buffer(buf, width, height, (left, top))
+
+    def grab_scaled(self, max_height):
+        buf, width, height, _, _ = self.grab_raw(max_height)
+        return Image.frombuffer("RGB", (width, height), buf, "raw", "BGRX", width * 4, 1)
+
+
+class SyntheticBackend(CaptureBackend):
+    """Generated desktop-like frame of a fixed size, for tests and benchmarks.
+
+    Never chosen by calibration; select it with OCP_CAPTURE_BACKEND=synthetic.
+    """
+
+    name = "synthetic"
+    calibrate = False
+
+    def __init__(self, size=(1920, 1080)):
+        super().__init__()
+        self.size = tuple(size)
+        self._frames = {}
+
+    def grab(self):
+        frame = self._frames.get(self.size)
+        if frame is None:
+            frame = synthetic_frame(self.size)
+            self._frames = {self.size: frame}
+        return frame.copy()
+
+    def grab_frame(self):
+        return Frame.from_image(self.grab())
+
+
+def synthetic_frame(size):
+    """Draw a desktop-like test image: background gradient, windows, title bars and text."""
+    width, height = size
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    step = max(200, width // 6)
+    for i, x in enumerate(range(40, width - 200, step)):
+        y = 40 + (i * 97) % max(1, height // 2)
+        w, h = min(step * 2, width - x - 20), min(height // 2, height - y - 20)
+        draw.rectangle([x, y, x + w, y + h], fill=(245, 245, 245), outline=(90, 90, 90))
+        draw.rectangle([x, y, x + w, y + 28], fill=(0, 46, 86))
+        draw.text((x + 8, y + 8), f"Window {i}", fill=(255, 255, 255))
+        for row in range(y + 40, y + h - 14, 16):
+            draw.text((x + 10, row), f"Line {row} lorem ipsum dolor sit amet {i * row}", fill=(20, 20, 20))
+    return img
+
+
+class CaptureManager:
+    """Picks the fastest working backend once per machine and falls back on failure."""
+
+    def __init__(self, backends=None, cache_path=None):
+        self.backends = backends if backends is not None else BACKENDS
+        if cache_path is None:
+            try:
+                cache_path = os.path.join(user_data_dir(), CALIBRATION_FILE)
+            except OSError:
+                cache_path = None
+        self.cache_path = cache_path
+        self.preferred = None
+        self.last_backend = None
+        self._selected = False
+        self._consecutive_failures = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                name = json.load(f).get("backend")
+        except (OSError, ValueError):
+            return None
+        if name not in self.backends:
+            return None
+        if not self.backends[name].full_desktop and any(
+                b.full_desktop and b.calibrate and b.available() for b in self.backends.values()):
+            return None
+        return name
+
+    def _save(self, name, results):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump({"backend": name, "calibrated_at": time.time(), "results": results}, f)
+        except OSError as e:
+            print(f"[CaptureManager] Could not save calibration: {e}")
+
+    def calibrate(self):
+        """Time one capture per eligible backend and remember the fastest.
+
+        Only backends that returned the largest frame are compared, so one
+        that grabs just the primary monitor never wins on a multi-monitor
+        desktop by copying fewer pixels; partial-desktop backends are only
+        timed when no full-desktop backend works.
+        """
+        results, sizes = {}, {}
+        for full in (True, False):
+            for name, backend in self.backends.items():
+                if backend.full_desktop != full or not backend.calibrate or not backend.available():
+                    continue
+                try:
+                    backend.capture()
+                    results[name] = backend.last_latency_ms
+                    sizes[name] = backend.last_size
+                except Exception as e:
+                    print(f"[CaptureManager] Backend {name} failed calibration: {e}")
+            if results:
+                break
+        if not results:
+            return None
+        largest = max(w * h for w, h in sizes.values())
+        candidates = [name for name in results if sizes[name][0] * sizes[name][1] == largest]
+        best = min(candidates, key=results.get)
+        print(f"[CaptureManager] Calibrated: using {best} ({results[best]:.0f} ms)")
+        self._save(best, results)
+        return best
+
+    def select(self):
+        """Return the preferred backend name, calibrating on first run."""
+        with self._lock:
+            if not self._selected:
+                self._selected = True
+                forced = os.environ.get("OCP_CAPTURE_BACKEND", "").strip().lower()
+                if forced in self.backends:
+                    self.preferred = forced
+                else:
+                    self.preferred = self._load() or self.calibrate()
+            return self.preferred
+
+    def _order(self):
+        preferred = self.select()
+        others = [n for n, b in self.backends.items()
+                  if n != preferred and b.calibrate and b.available()]
+        others.sort(key=lambda n: not self.backends[n].full_desktop)
+        return ([preferred] if preferred else []) + others
+
+    def capture(self):
+        """Capture a Frame with the preferred backend, falling back through the others."""
+        for name in self._order():
+            backend = self.backends[name]
+            try:
+                frame = backend.capture()
+            except Exception as e:
+                print(f"[CaptureManager] {name} capture failed: {e}")
+                if name == self.preferred:
+                    self._consecutive_failures += 1
+                    if self._consecutive_failures >= MAX_FAILURES:
+                        print(f"[CaptureManager] {name} keeps failing; recalibrating next time.")
+                        self.preferred = None
+                        self._selected = False
+                        self._consecutive_failures = 0
+                        if self.cache_path and os.path.exists(self.cache_path):
+                            os.remove(self.cache_path)
+                continue
+            if name == self.preferred:
+                self._consecutive_failures = 0
+            self.last_backend = name
+            return frame
+        return None
+
+    def capture_scaled(self, max_height):
+        """Small whole-desktop image for background use (replay); None on failure.
+
+        Backends that scale while copying (GDI StretchBlt) are tried first
+        whatever was calibrated, since a full-resolution grab per frame is
+        what makes the replay expensive on large desktops.
+        """
+        order = self._order()
+        order.sort(key=lambda n: not self.backends[n].scales_natively)
+        for name in order:
+            try:
+                return self.backends[name].grab_scaled(max_height)
+            except Exception:
+                continue
+        return None
+
+    def describe_last(self):
+        """e.g. "imagegrab, 42 ms, 5120x1440" for the ticket body."""
+        if self.last_backend is None:
+            return "N/A"
+        stats = self.backends[self.last_backend].stats()
+        w, h = stats["size"]
+        return f"{self.last_backend}, {stats['latency_ms']:.0f} ms, {w}x{h}"
+
+    def stats(self):
+        return {name: backend.stats() for name, backend in self.backends.items()}
+
+
+for _backend in (ImageGrabBackend(), RawBufferBackend(), PyAutoGUIBackend(), SyntheticBackend()):
+    register_backend(_backend)
+
+_manager = None
+
+
+def get_capture_manager():
+    global _manager
+    if _manager is None:
+        _manager = CaptureManager()
+    return _manager
@@ -0,0 +1,106 @@
+"""Concurrent collection engine for system information probes."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+TIMED_OUT = "Timed out"
+FAILED = "N/A"
+
+DEFAULT_WORKERS = 6
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_BUDGET = 3.0
+
+
+class Collector:
+    """A named probe with its own deadline and a fallback value."""
+
+    def __init__(self, key, func, timeout=DEFAULT_TIMEOUT, default=FAILED):
+        self.key = key
+        self.func = func
+        self.timeout = timeout
+        self.default = default
+
+
+class CollectionEngine:
+    """Runs collectors in parallel on a bounded worker pool.
+
+    Every collector gets its own deadline and the whole call an overall
+    budget. Collectors that miss their deadline are reported with the
+    TIMED_OUT marker and their key is listed under "timed_out". A probe
+    that is still running from an earlier call is not started again; the
+    new call waits on the in-flight future instead, so a hung probe can
+    occupy at most one worker.
+    """
+
+    def __init__(self, collectors, max_workers=DEFAULT_WORKERS):
+        self.collectors = {c.key: c for c in collectors}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sysinfo")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, collector):
+        with self._lock:
+            future = self._inflight.get(collector.key)
+            if future is not None and not future.done():
+                return future
+            future = self._pool.submit(collector.func)
+            self._inflight[collector.key] = future
+            return future
+
+    def _result(self, collector, future):
+        try:
+            return future.result(timeout=0)
+        except Exception as e:
+            print(f"[Collector] {collector.key} failed: {e}")
+            return collector.default
+
+    def collect(self, keys=None, budget=DEFAULT_BUDGET, on_result=None):
+        """Run the selected collectors and return {key: value}.
+
+        Args:
+            keys: iterable of collector keys, or None for all collectors
+            budget: overall time limit in seconds for the whole call
+            on_result: optional callback(key, value) invoked from the
+                calling thread as each result arrives
+
+        Returns:
+            dict with one entry per collector plus "timed_out", a list of
+            the keys that did not finish in time
+        """
+        selected = [self.collectors[k] for k in (keys or self.collectors)]
+        start = time.monotonic()
+        overall_deadline = start + budget
+
+        pending = {}
+        for collector in selected:
+            future = self._submit(collector)
+            deadline = min(start + collector.timeout, overall_deadline)
+            pending[future] = (collector, deadline)
+
+        results = {}
+        while pending:
+            now = time.monotonic()
+            for future, (collector, deadline) in list(pending.items()):
+                if future.done():
+                    value = self._result(collector, future)
+                elif now >= deadline:
+                    value = TIMED_OUT
+                else:
+                    continue
+                del pending[future]
+                results[collector.key] = value
+                if on_result is not None:
+                    on_result(collector.key, value)
+
+            if not pending:
+                break
+            next_deadline = min(deadline for _, deadline in pending.values())
+            wait(list(pending), timeout=max(0.0, next_deadline - time.monotonic()),
+                 return_when=FIRST_COMPLETED)
+
+        results["timed_out"] = [k for k, v in results.items() if v == TIMED_OUT]
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
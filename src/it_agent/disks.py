@@ -0,0 +1,180 @@
+"""All-volume disk usage with per-volume timeouts and backoff for dead drives."""
+
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import psutil
+
+PROBE_TIMEOUT = 1.0
+BACKOFF_BASE = 30.0
+BACKOFF_MAX = 1800.0
+MAX_WORKERS = 4
+
+DRIVE_REMOVABLE = 2
+DRIVE_REMOTE = 4
+DRIVE_RAMDISK = 6
+ERROR_NOT_READY = 21
+SEM_FAILCRITICALERRORS = 0x0001
+
+
+def _windows_drives():
+    """(mount, remote) for every lettered drive, without touching the drives themselves.
+
+    GetLogicalDrives and GetDriveTypeW only read the local drive table, so
+    a mapped share whose server is gone cannot stall the enumeration.
+    """
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetDriveTypeW.argtypes = [ctypes.c_wchar_p]
+    mask = kernel32.GetLogicalDrives()
+    drives = []
+    for i in range(26):
+        if mask & (1 << i):
+            mount = f"{chr(ord('A') + i)}:\\"
+            kind = kernel32.GetDriveTypeW(mount)
+            if DRIVE_REMOVABLE <= kind <= DRIVE_RAMDISK:
+                drives.append((mount, kind == DRIVE_REMOTE))
+    return drives
+
+
+def _windows_probe(mount):
+    """(fstype, usage) for one drive, or None if it has no media (empty card reader or DVD drive)."""
+    import ctypes
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.SetThreadErrorMode(SEM_FAILCRITICALERRORS, None)
+    fstype = ctypes.create_unicode_buffer(64)
+    if not kernel32.GetVolumeInformationW(ctypes.c_wchar_p(mount), None, 0, None, None, None,
+                                          fstype, len(fstype)):
+        error = ctypes.get_last_error()
+        if error == ERROR_NOT_READY:
+            return None
+        raise ctypes.WinError(error)
+    return fstype.value, psutil.disk_usage(mount)
+
+
+def _probe(mount):
+    return None, psutil.disk_usage(mount)
+
+
+class DiskProber:
+    """Queries every partition in a worker with its own timeout.
+
+    A volume that times out or errors is not probed again until its
+    backoff expires (BACKOFF_BASE doubled per consecutive failure, up to
+    BACKOFF_MAX). A probe still hung from a previous call is never
+    resubmitted, so a dead network share holds at most one worker.
+
+    On Windows the drive letters are listed from the local drive table
+    and everything that touches a drive (file system name and usage) is
+    done in the probe, so a dead mapped drive is subject to the same
+    timeout and backoff rather than stalling the enumeration.
+    """
+
+    def __init__(self, timeout=PROBE_TIMEOUT, max_workers=MAX_WORKERS):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="disk")
+        self._inflight = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _partitions(self):
+        """(mount, fstype, remote, probe) per volume; fstype None means the probe reports it."""
+        if platform.system() == "Windows":
+            return [(mount, None, remote, _windows_probe) for mount, remote in _windows_drives()]
+        return [(p.mountpoint, p.fstype, "remote" in p.opts, _probe) for p in psutil.disk_partitions(all=False)]
+
+    def _backoff_until(self, mount):
+        return self._failures.get(mount, (0, 0.0))[1]
+
+    def _record_failure(self, mount, now):
+        failures, _ = self._failures.get(mount, (0, 0.0))
+        failures += 1
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (failures - 1)))
+        self._failures[mount] = (failures, now + delay)
+
+    def collect(self):
+        """Return one dict per volume: mount, fstype, remote, total, free, percent, status."""
+        try:
+            partitions = self._partitions()
+        except Exception as e:
+            print(f"[DiskProber] Could not enumerate partitions: {e}")
+            return []
+
+        now = time.monotonic()
+        volumes = []
+        futures = {}
+        with self._lock:
+            for mount, fstype, remote, probe in partitions:
+                volume = {
+                    "mount": mount,
+                    "fstype": fstype or "?",
+                    "remote": remote,
+                    "status": "ok",
+                }
+                volumes.append(volume)
+                if self._backoff_until(mount) > now:
+                    volume["status"] = "unreachable (skipped)"
+                    continue
+                future = self._inflight.get(mount)
+                if future is None or future.done():
+                    future = self._pool.submit(probe, mount)
+                    self._inflight[mount] = future
+                futures[mount] = future
+
+        if futures:
+            wait(list(futures.values()), timeout=self.timeout)
+
+        now = time.monotonic()
+        with self._lock:
+            for volume in list(volumes):
+                future = futures.get(volume["mount"])
+                if future is None:
+                    continue
+                if not future.done():
+                    volume["status"] = "timed out"
+                    self._record_failure(volume["mount"], now)
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    volume["status"] = f"error: {e.__class__.__name__}"
+                    self._record_failure(volume["mount"], now)
+                    continue
+                self._failures.pop(volume["mount"], None)
+                if result is None:
+                    volumes.remove(volume)
+                    continue
+                fstype, usage = result
+                if fstype:
+                    volume["fstype"] = fstype
+                volume.update(total=usage.total, free=usage.free, percent=usage.percent)
+        return volumes
+
+
+def _gb(n):
+    return f"{n / (1024 ** 3):.0f} GB" if n >= 1024 ** 3 else f"{n / (1024 ** 2):.0f} MB"
+
+
+def format_table(volumes):
+    """Render the volume list as compact text lines for the ticket body."""
+    if not isinstance(volumes, list):
+        return str(volumes)
+    lines = []
+    for v in volumes:
+        kind = f"{v['fstype']}, network" if v["remote"] else v["fstype"]
+        if "percent" in v:
+            lines.append(f"{v['mount']} ({kind}): {v['percent']}% used, {_gb(v['free'])} free of {_gb(v['total'])}")
+        else:
+            lines.append(f"{v['mount']} ({kind}): {v['status']}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+_prober = None
+
+
+def get_disk_prober():
+    global _prober
+    if _prober is None:
+        _prober = DiskProber()
+    return _prober
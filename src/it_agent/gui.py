@@ -3,10 +3,14 @@
 import customtkinter as ctk
 from PIL import Image, ImageTk
 from datetime import datetime
-from src.it_agent.screenshot import image_to_thumbnail
-from src.it_agent.api import send_ticket
+from src.it_agent.screenshot import (
+    CAPTURE_MODES, describe_encoding, encode_frame, image_to_thumbnail, submit_thumbnail,
+)
+from src.it_agent.api import endpoint_status, send_ticket
+from src.it_agent.processes import format_short as format_top_processes
 import threading
-import io
+import string
+import math
 import os
 import sys
 
@@ -22,6 +26,33 @@ OCP_TEXT_DIM = "#8899AA"
 
 ctk.set_appearance_mode("dark")
 
+PENDING = "\u2026"
+REQUIRED_FIELDS = ("hostname", "username")
+REQUIRED_WAIT_MS = 5000
+REENCODE_DELAY_MS = 400
+
+PERCENT_FIELDS = ("cpu_usage", "ram_usage", "disk_usage")
+FIELD_FORMATTERS = {"top_processes": format_top_processes}
+INFO_ROWS = {
+    "left": [
+        "Host: {hostname}",
+        "User: {username}",
+        "OS: {os_info}",
+        "IP: {local_ip}",
+    ],
+    "right": [
+        "CPU: {cpu_usage}  |  RAM: {ram_usage} ({total_ram})",
+        "Disk: {disk_usage}  |  Cores: {logical_processors}",
+        "Uptime: {uptime}",
+        "Battery: {battery}",
+        "Top: {top_processes}",
+    ],
+}
+
+
+def _row_fields(template):
+    return tuple(name for _, name, _, _ in string.Formatter().parse(template) if name)
+
 
 def _resource_path(relative_path):
     """Get absolute path to resource, works for PyInstaller and cx_Freeze."""
@@ -37,7 +68,7 @@ def _resource_path(relative_path):
 class TicketWindow(ctk.CTkToplevel):
     """The OCP IT Helpdesk popup window."""
 
-    def __init__(self, master, sysinfo, screenshot_buf, screenshot_img):
+    def __init__(self, master, sysinfo, screenshot_job, screenshot_frame, replay_job=None):
         super().__init__(master)
         self.title("OCP IT Helpdesk")
         self.geometry("620x780")
@@ -46,11 +77,23 @@ class TicketWindow(ctk.CTkToplevel):
         self.protocol("WM_DELETE_WINDOW", self._on_close)
         self.configure(fg_color=OCP_DARK_BG)
 
-        self.sysinfo = sysinfo
-        self.screenshot_buf = screenshot_buf
-        self.screenshot_img = screenshot_img
+        self.sysinfo = dict(sysinfo)
+        self._pending = {k for row in INFO_ROWS["left"] + INFO_ROWS["right"] for k in _row_fields(row)}
+        self._pending |= set(REQUIRED_FIELDS)
+        self._pending -= set(self.sysinfo)
+        self._info_labels = {}
+        self._default_subject = None
+        self._submit_waited = 0
+        self.screenshot_job = screenshot_job
+        self.screenshot_frame = screenshot_frame
+        self.replay_job = replay_job
         self.screenshot_removed = False
+        self._sending = False
+        self._cancel_upload = None
         self._tk_thumb = None
+        self._drag_start = None
+        self._drag_item = None
+        self._reencode_after = None
 
         self._build_ui()
         self.after(100, lambda: self.focus_force())
@@ -100,25 +143,14 @@ class TicketWindow(ctk.CTkToplevel):
         right_col = ctk.CTkFrame(info_grid, fg_color="transparent")
         right_col.pack(side="right", fill="x", expand=True)
 
-        left_items = [
-            f"Host: {self.sysinfo['hostname']}",
-            f"User: {self.sysinfo['username']}",
-            f"OS: {self.sysinfo['os_info']}",
-            f"IP: {self.sysinfo['local_ip']}",
-        ]
-        right_items = [
-            f"CPU: {self.sysinfo['cpu_usage']}%  |  RAM: {self.sysinfo['ram_usage']}% ({self.sysinfo.get('total_ram', 'N/A')})",
-            f"Disk: {self.sysinfo['disk_usage']}%  |  Cores: {self.sysinfo.get('logical_processors', 'N/A')}",
-            f"Uptime: {self.sysinfo.get('uptime', 'N/A')}",
-            f"Battery: {self.sysinfo.get('battery', 'N/A')}",
-        ]
-
-        for text in left_items:
-            ctk.CTkLabel(left_col, text=text, font=ctk.CTkFont(size=11), text_color=OCP_TEXT_DIM, anchor="w").pack(anchor="w", pady=1)
-        for text in right_items:
-            ctk.CTkLabel(right_col, text=text, font=ctk.CTkFont(size=11), text_color=OCP_TEXT_DIM, anchor="w").pack(anchor="w", pady=1)
-
-        if self.screenshot_img is not None:
+        for column, rows in (("left", left_col), ("right", right_col)):
+            for template in INFO_ROWS[column]:
+                label = ctk.CTkLabel(rows, text=self._format_row(template), font=ctk.CTkFont(size=11),
+                                     text_color=OCP_TEXT_DIM, anchor="w")
+                label.pack(anchor="w", pady=1)
+                self._info_labels[template] = label
+
+        if self.screenshot_frame is not None:
             ss_card = ctk.CTkFrame(content, fg_color=OCP_CARD_BG, corner_radius=8)
             ss_card.pack(fill="x", padx=20, pady=(6, 6))
 
@@ -130,13 +162,46 @@ class TicketWindow(ctk.CTkToplevel):
                 text_color=OCP_CYAN,
             ).pack(side="left")
 
-            thumb = image_to_thumbnail(self.screenshot_img, max_height=110)
+            self._mode_labels = {label: mode for mode, label in CAPTURE_MODES.items()}
+            self.mode_var = ctk.StringVar(value=CAPTURE_MODES.get(self.screenshot_frame.mode, "All screens"))
+            ctk.CTkSegmentedButton(
+                ss_header,
+                values=list(CAPTURE_MODES.values()),
+                variable=self.mode_var,
+                command=self._on_mode_change,
+                font=ctk.CTkFont(size=11),
+                selected_color=OCP_BLUE,
+                selected_hover_color=OCP_NAVY,
+            ).pack(side="right")
+
+            thumb = self.screenshot_frame.thumbnail or image_to_thumbnail(self.screenshot_frame.image)
             self._tk_thumb = ImageTk.PhotoImage(thumb)
 
             thumb_container = ctk.CTkFrame(ss_card, fg_color=OCP_INPUT_BG, corner_radius=6)
             thumb_container.pack(padx=15, pady=(0, 4))
-            self.thumb_label = ctk.CTkLabel(thumb_container, image=self._tk_thumb, text="")
-            self.thumb_label.pack(padx=5, pady=5)
+            self.thumb_canvas = ctk.CTkCanvas(thumb_container, width=thumb.width, height=thumb.height,
+                                              bg=OCP_INPUT_BG, highlightthickness=0, cursor="crosshair")
+            self.thumb_canvas.pack(padx=5, pady=5)
+            self._thumb_item = self.thumb_canvas.create_image(0, 0, anchor="nw", image=self._tk_thumb)
+            self._removed_item = self.thumb_canvas.create_text(
+                thumb.width // 2, thumb.height // 2, text="[Screenshot removed]",
+                fill=OCP_TEXT_DIM, state="hidden")
+            self.thumb_canvas.bind("<ButtonPress-1>", self._on_redact_start)
+            self.thumb_canvas.bind("<B1-Motion>", self._on_redact_drag)
+            self.thumb_canvas.bind("<ButtonRelease-1>", self._on_redact_end)
+
+            redact_bar = ctk.CTkFrame(ss_card, fg_color="transparent")
+            redact_bar.pack(fill="x", padx=15, pady=(0, 4))
+            ctk.CTkLabel(
+                redact_bar, text="Drag on the preview to black out sensitive areas.",
+                font=ctk.CTkFont(size=11), text_color=OCP_TEXT_DIM,
+            ).pack(side="left")
+            ctk.CTkButton(
+                redact_bar, text="Clear", width=60, height=22,
+                font=ctk.CTkFont(size=11),
+                fg_color=OCP_INPUT_BG, hover_color=OCP_NAVY,
+                command=self._clear_redactions,
+            ).pack(side="right")
 
             self.remove_ss_var = ctk.BooleanVar(value=False)
             self.remove_ss_check = ctk.CTkCheckBox(
@@ -152,6 +217,20 @@ class TicketWindow(ctk.CTkToplevel):
             )
             self.remove_ss_check.pack(anchor="w", padx=15, pady=(0, 8))
 
+        if self.replay_job is not None:
+            self.replay_var = ctk.BooleanVar(value=True)
+            self.replay_check = ctk.CTkCheckBox(
+                ss_card if self.screenshot_frame is not None else content,
+                text="Attach replay of the last few seconds",
+                variable=self.replay_var,
+                font=ctk.CTkFont(size=11),
+                text_color=OCP_TEXT_DIM,
+                fg_color=OCP_BLUE,
+                hover_color=OCP_NAVY,
+                border_color=OCP_SILVER,
+            )
+            self.replay_check.pack(anchor="w", padx=15 if self.screenshot_frame is not None else 35, pady=(0, 8))
+
         form_card = ctk.CTkFrame(content, fg_color=OCP_CARD_BG, corner_radius=8)
         form_card.pack(fill="x", padx=20, pady=(6, 6))
 
@@ -174,9 +253,7 @@ class TicketWindow(ctk.CTkToplevel):
         )
         self.email_entry.pack(fill="x", pady=(3, 0))
 
-        detected_email = self.sysinfo.get("user_email", "")
-        if detected_email and "@" in detected_email:
-            self.email_entry.insert(0, detected_email)
+        self._fill_email()
 
         subj_row = ctk.CTkFrame(form_card, fg_color="transparent")
         subj_row.pack(fill="x", padx=15, pady=(6, 6))
@@ -187,7 +264,6 @@ class TicketWindow(ctk.CTkToplevel):
             text_color=OCP_TEXT,
         ).pack(anchor="w")
 
-        default_subject = f"Support Request from {self.sysinfo['username']} on {self.sysinfo['hostname']}"
         self.subject_entry = ctk.CTkEntry(
             subj_row, height=34,
             placeholder_text="Subject line...",
@@ -196,8 +272,8 @@ class TicketWindow(ctk.CTkToplevel):
             text_color=OCP_TEXT,
             placeholder_text_color=OCP_TEXT_DIM,
         )
-        self.subject_entry.insert(0, default_subject)
         self.subject_entry.pack(fill="x", pady=(3, 0))
+        self._fill_subject()
 
         desc_row = ctk.CTkFrame(form_card, fg_color="transparent")
         desc_row.pack(fill="x", padx=15, pady=(6, 6))
@@ -254,6 +330,10 @@ class TicketWindow(ctk.CTkToplevel):
             text_color=OCP_TEXT_DIM,
         )
         self.status_label.pack(side="left", fill="x", expand=True)
+        endpoint = endpoint_status()
+        if endpoint["state"] != "closed" or endpoint["retry_in"] > 0:
+            self.status_label.configure(
+                text="HappyFox is unreachable; your request will be saved and sent automatically.")
 
         self.submit_btn = ctk.CTkButton(
             footer_inner, text="Submit Request", width=200, height=40,
@@ -266,14 +346,193 @@ class TicketWindow(ctk.CTkToplevel):
         )
         self.submit_btn.pack(side="right")
 
+    def _value(self, key):
+        if key in self._pending or key not in self.sysinfo:
+            return PENDING
+        value = self.sysinfo[key]
+        if key in FIELD_FORMATTERS:
+            return FIELD_FORMATTERS[key](value)
+        if key in PERCENT_FIELDS and isinstance(value, (int, float)):
+            return f"{value}%"
+        return value
+
+    def _format_row(self, template):
+        return template.format_map({key: self._value(key) for key in _row_fields(template)})
+
+    def _fill_email(self):
+        detected_email = self.sysinfo.get("user_email", "")
+        if detected_email and "@" in detected_email and not self.email_entry.get().strip():
+            self.email_entry.insert(0, detected_email)
+
+    def _fill_subject(self):
+        """Set the default subject, unless the user has already edited it."""
+        if "username" not in self.sysinfo or "hostname" not in self.sysinfo:
+            return
+        current = self.subject_entry.get()
+        if current and current != self._default_subject:
+            return
+        self._default_subject = f"Support Request from {self.sysinfo['username']} on {self.sysinfo['hostname']}"
+        self.subject_entry.delete(0, "end")
+        self.subject_entry.insert(0, self._default_subject)
+
+    def set_info_field(self, key, value):
+        """Fill in one system information field as its collector finishes."""
+        if not self.winfo_exists():
+            return
+        self.sysinfo[key] = value
+        self._pending.discard(key)
+        for template, label in self._info_labels.items():
+            if key in _row_fields(template):
+                label.configure(text=self._format_row(template))
+        if key == "user_email":
+            self._fill_email()
+        elif key in ("username", "hostname"):
+            self._fill_subject()
+
+    def set_info_complete(self, sysinfo):
+        """Collection finished: apply every remaining field and clear placeholders."""
+        if not self.winfo_exists():
+            return
+        for key, value in sysinfo.items():
+            if self.sysinfo.get(key) != value or key in self._pending:
+                self.set_info_field(key, value)
+        self._pending.clear()
+        for template, label in self._info_labels.items():
+            label.configure(text=self._format_row(template))
+
     def _toggle_screenshot(self):
         if self.remove_ss_var.get():
-            self.thumb_label.configure(image=None, text="[Screenshot removed]")
             self.screenshot_removed = True
+            self._show_preview(False)
+            if self.screenshot_job is not None:
+                self.screenshot_job.close()
+            self._sync_replay()
         else:
-            if self._tk_thumb:
-                self.thumb_label.configure(image=self._tk_thumb, text="")
             self.screenshot_removed = False
+            self._sync_replay()
+            self._show_preview(True)
+            if (self.screenshot_job is None or self.screenshot_job.cancelled) and not self.screenshot_frame.released:
+                self.screenshot_job = encode_frame(self.screenshot_frame)
+
+    def _show_preview(self, visible):
+        state = "normal" if visible else "hidden"
+        self.thumb_canvas.itemconfigure(self._thumb_item, state=state)
+        self.thumb_canvas.itemconfigure("redaction", state=state)
+        self.thumb_canvas.itemconfigure(self._removed_item, state="hidden" if visible else "normal")
+
+    def _on_mode_change(self, label):
+        """Cut the newly selected region from the held frame and re-encode it."""
+        mode = self._mode_labels[label]
+        if mode == self.screenshot_frame.mode or self.screenshot_frame.released:
+            return
+        if self.screenshot_job is not None:
+            self.screenshot_job.close()
+        self.screenshot_frame.select(mode)
+        future = submit_thumbnail(self.screenshot_frame)
+        future.add_done_callback(lambda f: self.after(0, self._show_thumbnail, mode, f))
+        self.screenshot_job = None if self.screenshot_removed else encode_frame(self.screenshot_frame)
+
+    def _show_thumbnail(self, mode, future):
+        if mode != self.screenshot_frame.mode or future.exception() is not None:
+            return
+        thumb = future.result()
+        self.screenshot_frame.thumbnail = thumb
+        self._tk_thumb = ImageTk.PhotoImage(thumb)
+        self.thumb_canvas.configure(width=thumb.width, height=thumb.height)
+        self.thumb_canvas.itemconfigure(self._thumb_item, image=self._tk_thumb)
+        self.thumb_canvas.coords(self._removed_item, thumb.width // 2, thumb.height // 2)
+        self._draw_redactions()
+
+    def _thumb_scale(self):
+        """(region box, x scale, y scale) mapping thumbnail pixels to desktop pixels."""
+        frame = self.screenshot_frame
+        if frame.thumbnail is None:
+            return None
+        box = frame.box_for(frame.mode)
+        return box, (box[2] - box[0]) / frame.thumbnail.width, (box[3] - box[1]) / frame.thumbnail.height
+
+    def _on_redact_start(self, event):
+        if self.screenshot_removed or self._thumb_scale() is None:
+            return
+        self._drag_start = (event.x, event.y)
+        self._drag_item = self.thumb_canvas.create_rectangle(
+            event.x, event.y, event.x, event.y, outline="#E74C3C", width=2)
+
+    def _on_redact_drag(self, event):
+        if self._drag_item is not None:
+            self.thumb_canvas.coords(self._drag_item, *self._drag_start, event.x, event.y)
+
+    def _on_redact_end(self, event):
+        if self._drag_item is None:
+            return
+        self.thumb_canvas.delete(self._drag_item)
+        self._drag_item = None
+        scale = self._thumb_scale()
+        if scale is None:
+            return
+        (left, top, right, bottom), sx, sy = scale
+        thumb = self.screenshot_frame.thumbnail
+        x0, x1 = sorted(max(0, min(x, thumb.width)) for x in (self._drag_start[0], event.x))
+        y0, y1 = sorted(max(0, min(y, thumb.height)) for y in (self._drag_start[1], event.y))
+        if x1 - x0 < 3 or y1 - y0 < 3:
+            return
+        self.screenshot_frame.redactions.append((
+            left + math.floor(x0 * sx), top + math.floor(y0 * sy),
+            min(right, left + math.ceil(x1 * sx)), min(bottom, top + math.ceil(y1 * sy)),
+        ))
+        self._draw_redactions()
+        self._schedule_reencode()
+        self._sync_replay()
+
+    def _clear_redactions(self):
+        if not self.screenshot_frame.redactions:
+            return
+        self.screenshot_frame.redactions.clear()
+        self._draw_redactions()
+        self._schedule_reencode()
+        self._sync_replay()
+
+    def _replay_blocked(self):
+        """The clip shows the whole screen unredacted, so it never goes out once the screenshot is redacted or removed."""
+        return self.screenshot_frame is not None and (self.screenshot_removed or bool(self.screenshot_frame.redactions))
+
+    def _sync_replay(self):
+        if self.replay_job is None:
+            return
+        if self._replay_blocked():
+            self.replay_var.set(False)
+            self.replay_check.configure(state="disabled", text="Replay not attached (screenshot redacted or removed)")
+        else:
+            self.replay_check.configure(state="normal", text="Attach replay of the last few seconds")
+
+    def _draw_redactions(self):
+        self.thumb_canvas.delete("redaction")
+        scale = self._thumb_scale()
+        if scale is None:
+            return
+        (left, top, right, bottom), sx, sy = scale
+        state = "hidden" if self.screenshot_removed else "normal"
+        for r0, r1, r2, r3 in self.screenshot_frame.redactions:
+            if r2 <= left or r0 >= right or r3 <= top or r1 >= bottom:
+                continue
+            self.thumb_canvas.create_rectangle(
+                (max(r0, left) - left) / sx, (max(r1, top) - top) / sy,
+                (min(r2, right) - left) / sx, (min(r3, bottom) - top) / sy,
+                fill="black", outline="#E74C3C", tags="redaction", state=state)
+
+    def _schedule_reencode(self):
+        """Re-encode shortly after the last redaction edit, so a burst of edits encodes once."""
+        if self._reencode_after is not None:
+            self.after_cancel(self._reencode_after)
+        self._reencode_after = self.after(REENCODE_DELAY_MS, self._reencode)
+
+    def _reencode(self):
+        self._reencode_after = None
+        if self.screenshot_removed or self.screenshot_frame.released:
+            return
+        if self.screenshot_job is not None:
+            self.screenshot_job.close()
+        self.screenshot_job = encode_frame(self.screenshot_frame)
 
     def _on_submit(self):
         email = self.email_entry.get().strip()
@@ -282,16 +541,28 @@ class TicketWindow(ctk.CTkToplevel):
 
         if not email or "@" not in email:
             self.status_label.configure(text="A valid email address is required.", text_color="#E74C3C")
+            self.submit_btn.configure(state="normal")
             self.email_entry.focus()
             return
         if not subject:
             self.status_label.configure(text="Subject is required.", text_color="#E74C3C")
+            self.submit_btn.configure(state="normal")
             return
         if not description:
             self.status_label.configure(text="Description is required.", text_color="#E74C3C")
+            self.submit_btn.configure(state="normal")
             return
 
         self.submit_btn.configure(state="disabled")
+
+        waiting = [k for k in REQUIRED_FIELDS if k in self._pending]
+        if waiting and self._submit_waited < REQUIRED_WAIT_MS:
+            self.status_label.configure(text="Collecting system information...", text_color=OCP_CYAN)
+            self._submit_waited += 100
+            self.after(100, self._on_submit)
+            return
+        self._submit_waited = 0
+
         self.status_label.configure(text="Sending...", text_color=OCP_CYAN)
 
         data = {
@@ -303,24 +574,83 @@ class TicketWindow(ctk.CTkToplevel):
             **self.sysinfo,
         }
 
-        ss_buf = None
-        if not self.screenshot_removed and self.screenshot_buf is not None:
-            ss_buf = io.BytesIO(self.screenshot_buf.getvalue())
+        if self._reencode_after is not None:
+            self.after_cancel(self._reencode_after)
+            self._reencode()
+
+        jobs = []
+        if not self.screenshot_removed and self.screenshot_job is not None:
+            jobs.append(self.screenshot_job)
+        if self.replay_job is not None and self.replay_var.get() and not self._replay_blocked():
+            jobs.append(self.replay_job)
 
-        thread = threading.Thread(target=self._submit_thread, args=(data, ss_buf), daemon=True)
+        self._sending = True
+        self._cancel_upload = threading.Event()
+        self.submit_btn.configure(state="normal", text="Cancel", fg_color="#E74C3C", command=self._on_cancel)
+        thread = threading.Thread(target=self._submit_thread, args=(data, jobs, self._cancel_upload), daemon=True)
         thread.start()
 
-    def _submit_thread(self, data, ss_buf):
-        success, message = send_ticket(data, ss_buf)
-        self.after(0, self._on_submit_result, success, message)
+    def _on_cancel(self):
+        """Abort the upload; the encoder stops at its next chunk."""
+        if self._cancel_upload is not None:
+            self._cancel_upload.set()
+        self.submit_btn.configure(state="disabled", text="Cancelling...")
+
+    def _report_progress(self, sent, total):
+        """Called on the upload thread (already throttled); hands off to the UI thread."""
+        self.after(0, self._show_progress, sent, total)
 
-    def _on_submit_result(self, success, message):
+    def _show_progress(self, sent, total):
+        if not self.winfo_exists() or not self._sending:
+            return
+        mb = 1024 * 1024
+        self.status_label.configure(
+            text=f"Sending... {sent / mb:.1f} of {total / mb:.1f} MB ({sent * 100 // max(total, 1)}%)",
+            text_color=OCP_CYAN,
+        )
+
+    def _submit_thread(self, data, jobs, cancel):
+        attachments = []
+        for job in jobs:
+            try:
+                attachments.extend(job.result() or [])
+            except Exception as e:
+                print(f"[TicketWindow] Screenshot encoding failed: {e}")
+        if attachments:
+            data["screenshot_encoding"] = "; ".join(
+                f"{a.filename}: {describe_encoding(a.params)}" for a in attachments)
+        try:
+            if cancel.is_set():
+                success, message = False, "Upload cancelled."
+            else:
+                success, message = send_ticket(data, attachments, self._report_progress, cancel)
+        finally:
+            self._sending = False
+        if success:
+            for job in jobs:
+                job.close()
+        self.after(0, self._on_submit_result, success, message, cancel.is_set())
+
+    def _on_submit_result(self, success, message, cancelled=False):
+        self._cancel_upload = None
+        self.submit_btn.configure(text="Submit Request", fg_color=OCP_BLUE, command=self._on_submit)
         if success:
             self.status_label.configure(text=message, text_color="#2ECC71")
+            self.submit_btn.configure(state="disabled")
             self.after(2000, self._on_close)
+        elif cancelled:
+            self.status_label.configure(text="Upload cancelled.", text_color=OCP_TEXT_DIM)
+            self.submit_btn.configure(state="normal")
         else:
             self.status_label.configure(text=message, text_color="#E74C3C")
             self.submit_btn.configure(state="normal")
 
     def _on_close(self):
+        for job in (self.screenshot_job, self.replay_job):
+            if job is not None and not self._sending:
+                job.close()
+        self.screenshot_job = None
+        self.replay_job = None
+        if self.screenshot_frame is not None:
+            self.screenshot_frame.release()
         self.destroy()
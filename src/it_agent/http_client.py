@@ -0,0 +1,127 @@
+"""Pooled keep-alive HTTP session for the HappyFox API, warmed before the user submits."""
+
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_CONNECTIONS = int(os.environ.get("OCP_HTTP_POOL_CONNECTIONS", 2))
+POOL_MAXSIZE = int(os.environ.get("OCP_HTTP_POOL_MAXSIZE", 4))
+CONNECT_TIMEOUT = float(os.environ.get("OCP_HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("OCP_HTTP_READ_TIMEOUT", 30))
+WARM_TIMEOUT = 5
+WARM_TTL = 30
+
+
+class HttpClient:
+    """One requests.Session with a bounded connection pool, shared by every API call.
+
+    Reusing the session keeps DNS, TCP and TLS set up between requests,
+    so a submit costs one round trip plus the upload. prewarm() opens
+    the connection in the background (F8 is pressed long before Submit);
+    reset() drops pooled connections after a network change, since they
+    are bound to the old interface.
+
+    Configured from the environment:
+        OCP_HTTP_POOL_CONNECTIONS  hosts kept in the pool (default 2)
+        OCP_HTTP_POOL_MAXSIZE      connections kept per host (default 4)
+        OCP_HTTP_CONNECT_TIMEOUT   seconds to connect (default 5)
+        OCP_HTTP_READ_TIMEOUT      seconds to wait for a response (default 30)
+    """
+
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self._session = None
+        self._lock = threading.Lock()
+        self._warming = False
+        self._warmed_at = float("-inf")
+        self._generation = 0
+        self.last_warm_ms = None
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._new_session()
+            return self._session
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        """session.request() with the client's (connect, read) timeout unless one is given."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def prewarm(self, url, auth=None):
+        """Open a pooled connection to `url`'s host in the background.
+
+        Skipped if one was opened in the last WARM_TTL seconds or a warm-up
+        is already running. Any response (even 401/404) leaves the
+        connection in the pool; failures are ignored, submit will retry.
+        """
+        with self._lock:
+            if self._warming or time.monotonic() - self._warmed_at < WARM_TTL:
+                return
+            self._warming = True
+            generation = self._generation
+        threading.Thread(target=self._warm, args=(url, auth, generation), name="http-warm", daemon=True).start()
+
+    def _warm(self, url, auth, generation):
+        start = time.perf_counter()
+        try:
+            session = self.session
+            session.head(url, auth=auth, allow_redirects=False,
+                         timeout=(self.timeout[0], WARM_TIMEOUT)).close()
+            self.last_warm_ms = round((time.perf_counter() - start) * 1000)
+            with self._lock:
+                if generation == self._generation:
+                    self._warmed_at = time.monotonic()
+        except Exception as e:
+            print(f"[HttpClient] Pre-warm of {url} failed: {e}")
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._warming = False
+
+    def reset(self):
+        """Close pooled connections; the next request (or prewarm) opens fresh ones.
+
+        A warm-up still running on the old session is disowned, so a
+        prewarm() right after a reset starts a new one instead of waiting
+        on a connection bound to the old interface.
+        """
+        with self._lock:
+            session, self._session = self._session, None
+            self._warmed_at = float("-inf")
+            self._warming = False
+            self._generation += 1
+        if session is not None:
+            session.close()
+
+    def close(self):
+        self.reset()
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
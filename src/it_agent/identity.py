@@ -0,0 +1,260 @@
+"""Logged-in user email / UPN resolution with pluggable sources and an on-disk cache."""
+
+import json
+import os
+import platform
+import threading
+import time
+from src.it_agent.paths import user_data_dir
+
+CACHE_FILE = "identity_cache.json"
+CACHE_TTL = 7 * 86400
+NEGATIVE_TTL = 3600
+
+NAME_USER_PRINCIPAL = 8
+TOKEN_QUERY = 0x0008
+TOKEN_USER = 1
+
+
+def _valid_email(value):
+    return bool(value) and "@" in value and " " not in value.strip()
+
+
+class EmailSource:
+    """A single place the user's email might be found.
+
+    Subclasses implement resolve() and return an email string, or None if
+    the source has no answer. `in_process` marks sources that do not spawn
+    a subprocess; the default resolver orders those first.
+    """
+
+    name = "source"
+    in_process = True
+
+    def resolve(self, username):
+        raise NotImplementedError
+
+
+class UPNSource(EmailSource):
+    """Azure AD / domain UPN via secur32!GetUserNameExW (same as whoami /upn)."""
+
+    name = "upn"
+
+    def resolve(self, username):
+        if platform.system() != "Windows":
+            return None
+        import ctypes
+        secur32 = ctypes.windll.secur32
+        size = ctypes.c_ulong(0)
+        secur32.GetUserNameExW(NAME_USER_PRINCIPAL, None, ctypes.byref(size))
+        if not size.value:
+            return None
+        buf = ctypes.create_unicode_buffer(size.value)
+        if not secur32.GetUserNameExW(NAME_USER_PRINCIPAL, buf, ctypes.byref(size)):
+            return None
+        return buf.value
+
+
+class OfficeIdentitySource(EmailSource):
+    """Office 365 signed-in identity from HKCU."""
+
+    name = "office"
+
+    def resolve(self, username):
+        if platform.system() != "Windows":
+            return None
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER,
+                            r"Software\Microsoft\Office\16.0\Common\Identity") as key:
+            value, _ = winreg.QueryValueEx(key, "ADUserName")
+            return value
+
+
+class IdentityCRLSource(EmailSource):
+    """Windows account email: first subkey under IdentityCRL\\UserExtendedProperties."""
+
+    name = "identitycrl"
+
+    def resolve(self, username):
+        if platform.system() != "Windows":
+            return None
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER,
+                            r"Software\Microsoft\IdentityCRL\UserExtendedProperties") as key:
+            return winreg.EnumKey(key, 0)
+
+
+class WhoamiSource(EmailSource):
+    """Subprocess fallback: whoami /upn."""
+
+    name = "whoami"
+    in_process = False
+
+    def resolve(self, username):
+        if platform.system() != "Windows":
+            return None
+        import subprocess
+        result = subprocess.run(
+            ["whoami", "/upn"],
+            capture_output=True, text=True, timeout=5,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        return result.stdout.strip()
+
+
+def default_sources():
+    sources = [UPNSource(), OfficeIdentitySource(), IdentityCRLSource(), WhoamiSource()]
+    return sorted(sources, key=lambda s: not s.in_process)
+
+
+def get_user_sid():
+    """Return the current user's SID string, or "" if it cannot be read in-process.
+
+    Reads the process token through ctypes (advapi32), so no pywin32 is needed.
+    """
+    if platform.system() != "Windows":
+        try:
+            return str(os.getuid())
+        except Exception:
+            return ""
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        advapi32 = ctypes.WinDLL("advapi32", use_last_error=True)
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        advapi32.OpenProcessToken.argtypes = [wintypes.HANDLE, wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE)]
+        advapi32.GetTokenInformation.argtypes = [wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p,
+                                                 wintypes.DWORD, ctypes.POINTER(wintypes.DWORD)]
+        advapi32.ConvertSidToStringSidW.argtypes = [ctypes.c_void_p, ctypes.POINTER(wintypes.LPWSTR)]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        kernel32.LocalFree.argtypes = [ctypes.c_void_p]
+
+        token = wintypes.HANDLE()
+        if not advapi32.OpenProcessToken(kernel32.GetCurrentProcess(), TOKEN_QUERY, ctypes.byref(token)):
+            return ""
+        try:
+            size = wintypes.DWORD(0)
+            advapi32.GetTokenInformation(token, TOKEN_USER, None, 0, ctypes.byref(size))
+            buf = ctypes.create_string_buffer(size.value)
+            if not advapi32.GetTokenInformation(token, TOKEN_USER, buf, size, ctypes.byref(size)):
+                return ""
+            sid = ctypes.c_void_p.from_buffer(buf).value
+            text = wintypes.LPWSTR()
+            if not advapi32.ConvertSidToStringSidW(sid, ctypes.byref(text)):
+                return ""
+            try:
+                return text.value
+            finally:
+                kernel32.LocalFree(text)
+        finally:
+            kernel32.CloseHandle(token)
+    except Exception:
+        return ""
+
+
+class EmailCache:
+    """JSON file cache of resolved emails keyed by "username|sid".
+
+    Failed lookups are stored as "" with a shorter TTL so a machine with
+    no discoverable email does not retry every source on every ticket.
+    """
+
+    def __init__(self, path=None, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[EmailCache] Could not write cache: {e}")
+
+    def get(self, key):
+        """Return (hit, email). A negative hit returns (True, "")."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if not entry or entry.get("expires", 0) <= time.time():
+                return False, ""
+            return True, entry.get("email", "")
+
+    def put(self, key, email):
+        with self._lock:
+            self._load()
+            ttl = self.ttl if email else self.negative_ttl
+            self._entries[key] = {"email": email, "expires": time.time() + ttl}
+            self._save()
+
+    def clear(self, key=None):
+        with self._lock:
+            self._load()
+            if key is None:
+                self._entries = {}
+            else:
+                self._entries.pop(key, None)
+            self._save()
+
+
+class EmailResolver:
+    """Tries sources in order and caches the first valid answer per user."""
+
+    def __init__(self, sources=None, cache=None):
+        self.sources = list(sources) if sources is not None else default_sources()
+        self.cache = cache if cache is not None else EmailCache()
+
+    def resolve(self, username, sid=""):
+        key = f"{username}|{sid}"
+        hit, email = self.cache.get(key)
+        if hit:
+            return email
+
+        for source in self.sources:
+            try:
+                value = source.resolve(username)
+            except Exception:
+                continue
+            if value and _valid_email(value):
+                email = value.strip()
+                break
+        else:
+            email = ""
+
+        self.cache.put(key, email)
+        return email
+
+
+_resolver = None
+
+
+def get_resolver():
+    """Return the process-wide resolver backed by the per-user cache file."""
+    global _resolver
+    if _resolver is None:
+        try:
+            path = os.path.join(user_data_dir(), CACHE_FILE)
+        except OSError:
+            path = None
+        _resolver = EmailResolver(cache=EmailCache(path))
+    return _resolver
@@ -0,0 +1,173 @@
+"""HappyFox metadata (categories, priorities, statuses) cached on disk and refreshed in the background."""
+
+import json
+import os
+import threading
+import time
+import requests
+from src.it_agent.http_client import get_client
+from src.it_agent.resilience import get_breaker, get_metrics, parse_retry_after
+from src.it_agent.paths import user_data_dir
+
+CACHE_FILE = "happyfox_metadata.json"
+CACHE_TTL = 24 * 3600
+NEGATIVE_TTL = 300
+MAX_NEGATIVE_TTL = 6 * 3600
+FETCH_TIMEOUT = 10
+
+RESOURCES = {
+    "categories": "categories/",
+    "priorities": "priorities/",
+    "statuses": "statuses/",
+}
+
+
+class MetadataCache:
+    """Lists of HappyFox objects by kind, persisted per endpoint with a TTL.
+
+    get() and lookup_id() only ever read the cache: a missing or expired
+    kind is refreshed on a background thread and the caller gets the
+    stale list (or None) immediately, so a ticket submit never waits on
+    a metadata request. A failed fetch keeps any previous list and is
+    retried after NEGATIVE_TTL, doubling per consecutive failure up to
+    MAX_NEGATIVE_TTL. prefetch() refreshes every expired kind at startup.
+    Entries are stored per endpoint base URL, so pointing the agent at
+    another HappyFox instance never reuses its IDs.
+    """
+
+    def __init__(self, base_url, auth=None, path=None, kinds=None, ttl=CACHE_TTL,
+                 negative_ttl=NEGATIVE_TTL, max_negative_ttl=MAX_NEGATIVE_TTL):
+        if path is None:
+            try:
+                path = os.path.join(user_data_dir(), CACHE_FILE)
+            except OSError:
+                path = None
+        self.base_url = base_url.rstrip("/")
+        self.auth = auth
+        self.path = path
+        self.kinds = dict(kinds) if kinds is not None else dict(RESOURCES)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_negative_ttl = max_negative_ttl
+        self._entries = None
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("base_url") == self.base_url:
+                self._entries = cached.get("kinds", {})
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"base_url": self.base_url, "kinds": self._entries}, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[MetadataCache] Could not write cache: {e}")
+
+    def get(self, kind):
+        """The cached list for `kind` (possibly stale) or None; refreshes in the background if expired."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(kind) or {}
+            expired = entry.get("expires", 0) <= time.time()
+        if expired:
+            self.refresh(kind)
+        return entry.get("items")
+
+    def lookup_id(self, kind, name):
+        """ID of the `kind` item called `name` (case-insensitive), or None if not known yet."""
+        wanted = name.strip().lower()
+        for item in self.get(kind) or ():
+            if str(item.get("name", "")).strip().lower() == wanted:
+                return item.get("id")
+        return None
+
+    def prefetch(self, retry_failed=False):
+        """Refresh every expired kind in the background.
+
+        With `retry_failed`, kinds whose last fetch failed are retried now
+        instead of waiting out their backoff (e.g. after a network change).
+        """
+        for kind in self.kinds:
+            with self._lock:
+                self._load()
+                failed = (self._entries.get(kind) or {}).get("failures", 0) > 0
+            if retry_failed and failed:
+                self.refresh(kind)
+            else:
+                self.get(kind)
+
+    def refresh(self, kind):
+        """Start a background fetch of `kind` unless one is already running."""
+        with self._lock:
+            if kind in self._refreshing:
+                return
+            self._refreshing.add(kind)
+        threading.Thread(target=self._refresh, args=(kind,), name=f"metadata-{kind}", daemon=True).start()
+
+    def _refresh(self, kind):
+        items = None
+        try:
+            items = self.fetch(kind)
+        except Exception as e:
+            print(f"[MetadataCache] Could not fetch {kind}: {e}")
+        try:
+            self._store(kind, items)
+        finally:
+            with self._lock:
+                self._refreshing.discard(kind)
+
+    def fetch(self, kind):
+        """GET the list for `kind` through its circuit breaker; raises on any HTTP or decoding error."""
+        url = f"{self.base_url}/{self.kinds[kind]}"
+        breaker = get_breaker(url)
+        breaker.check()
+        client = get_client()
+        get_metrics().count("attempts", url)
+        try:
+            response = client.get(url, auth=self.auth, timeout=(client.timeout[0], FETCH_TIMEOUT))
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure(parse_retry_after(response.headers.get("Retry-After")))
+        else:
+            breaker.record_success()
+        response.raise_for_status()
+        items = response.json()
+        if not isinstance(items, list):
+            raise ValueError(f"unexpected {kind} payload: {type(items).__name__}")
+        return [{"id": item.get("id"), "name": item.get("name", "")} for item in items if isinstance(item, dict)]
+
+    def _store(self, kind, items):
+        now = time.time()
+        with self._lock:
+            self._load()
+            entry = dict(self._entries.get(kind) or {})
+            if items is not None:
+                entry.update(items=items, fetched_at=now, failures=0, expires=now + self.ttl)
+            else:
+                failures = entry.get("failures", 0) + 1
+                backoff = min(self.max_negative_ttl, self.negative_ttl * 2 ** (failures - 1))
+                entry.update(failures=failures, expires=now + backoff)
+            self._entries[kind] = entry
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
@@ -0,0 +1,146 @@
+"""Streaming multipart/form-data body that reads attachments lazily, with progress and cancellation."""
+
+import io
+import threading
+import time
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 0.1
+
+
+class UploadCancelled(Exception):
+    """Raised from read() once the upload's cancel event is set."""
+
+
+class MultipartEncoder(io.RawIOBase):
+    """multipart/form-data body read a chunk at a time.
+
+    `fields` are (name, value) text pairs; `attachments` are objects with
+    filename, mime_type, size and reader() (AttachmentBuffer, or a spooled
+    attachment streamed from SQLite). Only the small part headers are
+    built up front; attachment bytes are pulled from their readers as
+    http.client asks for the next block, so memory stays flat however
+    large the attachments are. The total length is known in advance, so
+    requests sends a normal Content-Length body rather than chunks.
+
+    `on_progress(sent, total)` is called at most every PROGRESS_INTERVAL
+    seconds and once at the end. Setting `cancel` (a threading.Event)
+    makes the next read() raise UploadCancelled, which aborts the request
+    and discards its connection.
+    """
+
+    def __init__(self, fields=(), attachments=(), field_name="attachments", boundary=None,
+                 on_progress=None, cancel=None):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.on_progress = on_progress
+        self.cancel = cancel or threading.Event()
+        self._segments = []
+        for name, value in fields:
+            self._segments.append(self._header(name) + str(value).encode("utf-8") + b"\r\n")
+        for a in attachments:
+            self._segments.append(self._header(field_name, a.filename, a.mime_type))
+            self._segments.append(a)
+            self._segments.append(b"\r\n")
+        self._segments.append(f"--{self.boundary}--\r\n".encode("ascii"))
+        self.total = sum(len(s) if isinstance(s, bytes) else s.size for s in self._segments)
+        self.sent = 0
+        self._index = 0
+        self._offset = 0
+        self._reader = None
+        self._reported = 0.0
+
+    def _header(self, name, filename=None, mime_type=None):
+        disposition = f'form-data; name="{_quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{_quote(filename)}"'
+        lines = [f"--{self.boundary}", f"Content-Disposition: {disposition}"]
+        if mime_type:
+            lines.append(f"Content-Type: {mime_type}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.sent
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Only rewinding to the start is supported (requests does this before a resend)."""
+        if whence != io.SEEK_SET or offset not in (0, self.sent):
+            raise io.UnsupportedOperation("MultipartEncoder can only be rewound to the start")
+        if offset == 0:
+            self._close_reader()
+            self._index = self._offset = self.sent = 0
+        return self.sent
+
+    def read(self, size=-1):
+        if self.cancel.is_set():
+            self._close_reader()
+            raise UploadCancelled("Upload cancelled")
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        out = []
+        want = size
+        while want > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            if isinstance(segment, bytes):
+                chunk = segment[self._offset:self._offset + want]
+                self._offset += len(chunk)
+                done = self._offset >= len(segment)
+            else:
+                if self._reader is None:
+                    self._reader = segment.reader()
+                chunk = self._reader.read(want)
+                done = not chunk
+            if chunk:
+                out.append(chunk)
+                want -= len(chunk)
+            if done:
+                self._close_reader()
+                self._index += 1
+                self._offset = 0
+        data = b"".join(out)
+        self.sent += len(data)
+        self._progress()
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _progress(self):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if self.sent >= self.total or now - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            self.on_progress(self.sent, self.total)
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def close(self):
+        self._close_reader()
+        super().close()
+
+
+def _quote(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\r", " ").replace("\n", " ")
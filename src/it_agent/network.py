@@ -0,0 +1,328 @@
+"""Network identity: interfaces, default route, change detection and public IP."""
+
+import ipaddress
+import os
+import platform
+import socket
+import struct
+import threading
+import time
+import psutil
+import requests as req_lib
+
+POLL_INTERVAL = 5.0
+PUBLIC_IP_TTL = 600
+PUBLIC_IP_TIMEOUT = 3
+PUBLIC_IP_RETRY = 30
+PUBLIC_IP_URLS = [
+    u.strip() for u in os.environ.get(
+        "OCP_PUBLIC_IP_URLS", "https://api.ipify.org,https://ifconfig.me/ip"
+    ).split(",") if u.strip()
+]
+
+_MAC_FAMILIES = {getattr(psutil, "AF_LINK", -1), getattr(socket, "AF_PACKET", -2)}
+
+
+def _is_usable_ipv4(address):
+    try:
+        ip = ipaddress.IPv4Address(address)
+    except ValueError:
+        return False
+    return not (ip.is_loopback or ip.is_link_local or ip.is_unspecified)
+
+
+def _route_source_address():
+    """Source address the OS would use for an internet-bound packet.
+
+    Connecting a UDP socket only consults the routing table; nothing is
+    sent. Raises OSError when there is no default route.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(("8.8.8.8", 80))
+        return s.getsockname()[0]
+    finally:
+        s.close()
+
+
+def _linux_default_gateway():
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 3 and fields[1] == "00000000" and int(fields[3], 16) & 2:
+                    gateway = socket.inet_ntoa(int(fields[2], 16).to_bytes(4, "little"))
+                    return fields[0], gateway
+    except (OSError, ValueError, StopIteration):
+        pass
+    return None, None
+
+
+def _windows_default_gateway():
+    """Next hop of the route Windows would use for an internet address (GetBestRoute, in-process).
+
+    The interface is left to the caller (matched by source address), since
+    psutil names interfaces by friendly name rather than index.
+    """
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class MIB_IPFORWARDROW(ctypes.Structure):
+            _fields_ = [(name, wintypes.DWORD) for name in (
+                "dwForwardDest", "dwForwardMask", "dwForwardPolicy", "dwForwardNextHop",
+                "dwForwardIfIndex", "dwForwardType", "dwForwardProto", "dwForwardAge",
+                "dwForwardNextHopAS", "dwForwardMetric1", "dwForwardMetric2",
+                "dwForwardMetric3", "dwForwardMetric4", "dwForwardMetric5")]
+
+        iphlpapi = ctypes.windll.iphlpapi
+        iphlpapi.GetBestRoute.argtypes = [wintypes.DWORD, wintypes.DWORD, ctypes.POINTER(MIB_IPFORWARDROW)]
+        row = MIB_IPFORWARDROW()
+        dest = struct.unpack("<I", socket.inet_aton("8.8.8.8"))[0]
+        if iphlpapi.GetBestRoute(dest, 0, ctypes.byref(row)) != 0 or not row.dwForwardNextHop:
+            return None, None
+        return None, socket.inet_ntoa(struct.pack("<I", row.dwForwardNextHop))
+    except (OSError, AttributeError, ValueError):
+        return None, None
+
+
+def _default_gateway():
+    """(interface name or None, gateway IPv4 or None) of the default route."""
+    if platform.system() == "Windows":
+        return _windows_default_gateway()
+    return _linux_default_gateway()
+
+
+def _fingerprint():
+    """Cheap digest of the interface table and default route, used to detect changes.
+
+    The route is included so a new gateway on an unchanged address (a
+    different router on the same subnet, a VPN taking the default route)
+    is noticed too.
+    """
+    addrs = psutil.net_if_addrs()
+    stats = psutil.net_if_stats()
+    interfaces = tuple(sorted(
+        (name, bool(stats.get(name) and stats[name].isup),
+         tuple(sorted(a.address for a in entries if a.family not in _MAC_FAMILIES)))
+        for name, entries in addrs.items()
+    ))
+    return interfaces, _default_gateway()
+
+
+class NetworkIdentity:
+    """Caches the interface table and invalidates it only when it changes.
+
+    start() runs a poller that compares a fingerprint of the interface
+    table and default route every POLL_INTERVAL seconds and notifies
+    listeners on change.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Register callback(snapshot) to run on the poller thread after a change."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, name="network-poll", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                fingerprint = _fingerprint()
+            except Exception as e:
+                print(f"[NetworkIdentity] Poll failed: {e}")
+                continue
+            with self._lock:
+                changed = self._fingerprint is not None and fingerprint != self._fingerprint
+                if self._fingerprint is None or changed:
+                    self._fingerprint = fingerprint
+                if changed:
+                    self._snapshot = None
+            if changed:
+                print("[NetworkIdentity] Interface table changed.")
+                snapshot = self.snapshot()
+                for callback in list(self._listeners):
+                    try:
+                        callback(snapshot)
+                    except Exception as e:
+                        print(f"[NetworkIdentity] Listener failed: {e}")
+
+    def snapshot(self):
+        """Return the cached interface table, building it if invalidated."""
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+        snapshot = self._build()
+        with self._lock:
+            self._snapshot = snapshot
+            if self._fingerprint is None:
+                try:
+                    self._fingerprint = _fingerprint()
+                except Exception:
+                    pass
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def _build(self):
+        interfaces = []
+        try:
+            addrs = psutil.net_if_addrs()
+            stats = psutil.net_if_stats()
+        except Exception:
+            addrs, stats = {}, {}
+
+        for name, entries in addrs.items():
+            stat = stats.get(name)
+            iface = {"name": name, "up": bool(stat and stat.isup), "mac": "", "ipv4": [], "ipv6": []}
+            for entry in entries:
+                if entry.family in _MAC_FAMILIES:
+                    iface["mac"] = entry.address.replace("-", ":").upper()
+                elif entry.family == socket.AF_INET:
+                    iface["ipv4"].append(entry.address)
+                elif entry.family == socket.AF_INET6:
+                    iface["ipv6"].append(entry.address.split("%")[0])
+            interfaces.append(iface)
+
+        try:
+            primary = _route_source_address()
+        except OSError:
+            primary = None
+
+        route_iface, gateway = _default_gateway()
+        if primary is not None and route_iface is None:
+            route_iface = next((i["name"] for i in interfaces if primary in i["ipv4"]), None)
+        if primary is None:
+            candidates = [i for i in interfaces if i["up"]] + [i for i in interfaces if not i["up"]]
+            primary = next(
+                (ip for i in candidates for ip in i["ipv4"] if _is_usable_ipv4(ip)), None
+            )
+
+        return {
+            "interfaces": interfaces,
+            "primary_ip": primary or "N/A",
+            "default_interface": route_iface,
+            "default_gateway": gateway,
+        }
+
+    def primary_ip(self):
+        return self.snapshot()["primary_ip"]
+
+    def summary(self):
+        """One line per up interface with IPv4 addresses, e.g. "Ethernet: 10.0.0.5"."""
+        snapshot = self.snapshot()
+        parts = []
+        for iface in snapshot["interfaces"]:
+            usable = [ip for ip in iface["ipv4"] if not ip.startswith("127.")]
+            if iface["up"] and usable:
+                marker = "*" if iface["name"] == snapshot["default_interface"] else ""
+                parts.append(f"{iface['name']}{marker}: {', '.join(usable)}")
+        return "; ".join(parts) if parts else "N/A"
+
+
+class PublicIPResolver:
+    """Resolves the public IP asynchronously and caches it for a TTL.
+
+    get() never blocks: it returns the cached value (even if stale) and
+    starts a background refresh when the value is missing or expired.
+    invalidate() bumps a generation counter; a lookup started before it
+    is discarded, so a pre-change address is never cached afresh.
+    """
+
+    def __init__(self, urls=None, ttl=PUBLIC_IP_TTL, timeout=PUBLIC_IP_TIMEOUT):
+        self.urls = list(urls) if urls is not None else list(PUBLIC_IP_URLS)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._value = None
+        self._fetched_at = float("-inf")
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._generation = 0
+
+    def get(self):
+        with self._lock:
+            value = self._value
+            age = time.monotonic() - self._fetched_at
+            stale = age >= (PUBLIC_IP_RETRY if value is None else self.ttl)
+        if stale:
+            self.refresh()
+        return value if value is not None else "N/A"
+
+    def refresh(self):
+        """Start a background lookup unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            generation = self._generation
+        threading.Thread(target=self._refresh, args=(generation,), name="public-ip", daemon=True).start()
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._fetched_at = float("-inf")
+            self._generation += 1
+            self._refreshing = False
+
+    def _refresh(self, generation):
+        try:
+            value = self.fetch()
+            with self._lock:
+                if generation != self._generation:
+                    return
+                if value is not None:
+                    self._value = value
+                self._fetched_at = time.monotonic()
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._refreshing = False
+
+    def fetch(self):
+        """Query the resolver URLs in order and return the first valid address."""
+        for url in self.urls:
+            try:
+                response = req_lib.get(url, timeout=self.timeout)
+                text = response.text.strip()
+                ipaddress.ip_address(text)
+                return text
+            except Exception:
+                continue
+        return None
+
+
+_network = None
+_public_ip = None
+
+
+def get_network():
+    global _network
+    if _network is None:
+        _network = NetworkIdentity()
+    return _network
+
+
+def get_public_ip_resolver():
+    global _public_ip
+    if _public_ip is None:
+        _public_ip = PublicIPResolver()
+    return _public_ip
@@ -0,0 +1,58 @@
+"""Per-user and per-machine data directories for caches and state."""
+
+import os
+import platform
+import tempfile
+
+APP_DIR_NAME = "OCP_IT_Helpdesk"
+
+
+def user_data_dir():
+    """Per-user writable directory (LOCALAPPDATA on Windows, ~/.cache elsewhere)."""
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        path = os.path.join(base, APP_DIR_NAME)
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, APP_DIR_NAME.lower())
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _can_write(path):
+    """Create and delete a scratch file in `path`.
+
+    os.access() ignores NTFS ACLs, so a directory created by the
+    LocalSystem service would pass it and then refuse the tray's writes.
+    """
+    try:
+        fd, scratch = tempfile.mkstemp(prefix=".write-test-", dir=path)
+        os.close(fd)
+        os.remove(scratch)
+        return True
+    except OSError:
+        return False
+
+
+def program_data_dir(subdir=None):
+    """Machine-wide directory (ProgramData on Windows), falling back to the user directory.
+
+    The tray app runs as the logged-in user, so if the directory (or
+    `subdir` inside it) cannot actually be written by that user the same
+    path under the per-user directory is used instead.
+    """
+    if platform.system() == "Windows":
+        path = os.path.join(os.environ.get("ProgramData", "C:\\ProgramData"), APP_DIR_NAME)
+        if subdir:
+            path = os.path.join(path, subdir)
+        try:
+            os.makedirs(path, exist_ok=True)
+            if _can_write(path):
+                return path
+        except OSError:
+            pass
+    path = user_data_dir()
+    if subdir:
+        path = os.path.join(path, subdir)
+        os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,154 @@
+"""Single-pass top-N process snapshot."""
+
+import heapq
+import platform
+import threading
+import time
+import psutil
+
+TOP_N = 5
+WALK_BUDGET = 1.0
+PRIME_INTERVAL = 15.0
+
+_HANDLE_ATTR = "num_handles" if platform.system() == "Windows" else "num_fds"
+ATTRS = ["pid", "name", "create_time", "cpu_times", "memory_info", _HANDLE_ATTR]
+
+
+class ProcessTable:
+    """Walks the process table once per call and keeps CPU-time baselines.
+
+    CPU percentages are deltas of cumulative CPU time against the
+    baseline from the previous walk, which the background sampler
+    refreshes every PRIME_INTERVAL seconds via prime(). No per-process
+    sleeps are needed.
+    """
+
+    def __init__(self):
+        try:
+            self.cores = psutil.cpu_count(logical=True) or 1
+        except Exception:
+            self.cores = 1
+        self._baseline = {}
+        self._baseline_time = None
+        self._lock = threading.Lock()
+
+    def _walk(self, budget):
+        rows = []
+        partial = False
+        deadline = time.monotonic() + budget
+        for proc in psutil.process_iter(ATTRS, ad_value=None):
+            if time.monotonic() > deadline:
+                partial = True
+                break
+            info = proc.info
+            times = info.get("cpu_times")
+            mem = info.get("memory_info")
+            rows.append((
+                info["pid"],
+                info.get("name") or "?",
+                info.get("create_time"),
+                (times.user + times.system) if times else None,
+                mem.rss if mem else 0,
+                info.get(_HANDLE_ATTR) or 0,
+            ))
+        return rows, partial
+
+    def prime(self, budget=WALK_BUDGET):
+        """Record a CPU-time baseline for the next collect()."""
+        rows, _ = self._walk(budget)
+        self._set_baseline(rows, time.monotonic())
+
+    def _set_baseline(self, rows, now):
+        with self._lock:
+            self._baseline = {pid: (created, cpu) for pid, _, created, cpu, _, _ in rows if cpu is not None}
+            self._baseline_time = now
+
+    def collect(self, n=TOP_N, budget=WALK_BUDGET):
+        """Return the top `n` processes by CPU, resident memory and handle count."""
+        rows, partial = self._walk(budget)
+        now = time.monotonic()
+
+        with self._lock:
+            baseline = self._baseline
+            elapsed = now - self._baseline_time if self._baseline_time is not None else 0
+
+        entries = []
+        for pid, name, created, cpu, rss, handles in rows:
+            cpu_pct = None
+            base = baseline.get(pid)
+            if elapsed > 0 and cpu is not None and base is not None and base[0] == created:
+                cpu_pct = min(100.0, max(0.0, (cpu - base[1]) / elapsed / self.cores * 100))
+            entries.append({"pid": pid, "name": name, "cpu": cpu_pct, "rss": rss, "handles": handles})
+
+        self._set_baseline(rows, now)
+
+        return {
+            "count": len(rows),
+            "partial": partial,
+            "by_cpu": heapq.nlargest(n, (e for e in entries if e["cpu"] is not None), key=lambda e: e["cpu"]),
+            "by_memory": heapq.nlargest(n, entries, key=lambda e: e["rss"]),
+            "by_handles": heapq.nlargest(n, entries, key=lambda e: e["handles"]),
+        }
+
+
+def _fmt_proc(entry, metric, with_pid=True):
+    if metric == "cpu":
+        value = f"{entry['cpu']:.1f}%"
+    elif metric == "rss":
+        value = f"{entry['rss'] / (1024 ** 2):.0f} MB"
+    else:
+        value = str(entry["handles"])
+    if with_pid:
+        return f"{entry['name']} ({entry['pid']}) {value}"
+    return f"{entry['name']} {value}"
+
+
+def format_table(snapshot):
+    """Render a top-processes snapshot as text lines for the ticket body."""
+    if not isinstance(snapshot, dict):
+        return str(snapshot)
+    lines = [f"Processes: {snapshot['count']}" + (" (partial walk)" if snapshot["partial"] else "")]
+    for title, key, metric in (("CPU", "by_cpu", "cpu"), ("Memory", "by_memory", "rss"),
+                               ("Handles", "by_handles", "handles")):
+        items = snapshot.get(key) or []
+        if items:
+            lines.append(f"Top {title}: " + "; ".join(_fmt_proc(e, metric) for e in items))
+    return "\n".join(lines) + "\n"
+
+
+def format_short(snapshot, n=2):
+    """One-line summary for the info card, e.g. "chrome.exe 23.0%, Teams.exe 9.1%"."""
+    if not isinstance(snapshot, dict):
+        return str(snapshot)
+    items = snapshot.get("by_cpu") or snapshot.get("by_memory") or []
+    metric = "cpu" if snapshot.get("by_cpu") else "rss"
+    return ", ".join(_fmt_proc(e, metric, with_pid=False) for e in items[:n]) or "N/A"
+
+
+class ProcessPrimer:
+    """Sampler listener that refreshes the CPU-time baseline periodically."""
+
+    def __init__(self, table, interval=PRIME_INTERVAL):
+        self.table = table
+        self.interval = interval
+        self._last = float("-inf")
+
+    def __call__(self, sampler):
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.table.prime()
+
+
+_table = None
+
+
+def get_process_table():
+    global _table
+    if _table is None:
+        _table = ProcessTable()
+    return _table
+
+
+def start_process_priming(sampler):
+    sampler.add_listener(ProcessPrimer(get_process_table()))
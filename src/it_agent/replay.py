@@ -0,0 +1,237 @@
+"""Opt-in rolling replay of the last few seconds of the screen, attached as a short clip."""
+
+import collections
+import hashlib
+import io
+import os
+import threading
+import time
+import zlib
+from PIL import Image, features
+from src.it_agent.attachments import AttachmentBuffer
+from src.it_agent.capture import get_capture_manager
+from src.it_agent.screenshot import EncoderJob
+
+CPU_BUDGET = 0.01
+DEFAULT_FPS = 1.5
+DEFAULT_HEIGHT = 540
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+COARSE_INTERVAL = 5.0
+
+
+def _web_palette():
+    """Fixed 6x6x6 colour cube plus 40 greys, shared by every stored frame."""
+    pal = []
+    for r in range(6):
+        for g in range(6):
+            for b in range(6):
+                pal += [r * 51, g * 51, b * 51]
+    for i in range(40):
+        v = 8 + i * 6
+        pal += [v, v, v]
+    img = Image.new("P", (1, 1))
+    img.putpalette(pal)
+    return img
+
+
+PALETTE = _web_palette()
+
+
+class ReplayBuffer:
+    """Keeps the last `seconds` of downscaled screen frames in a bounded ring.
+
+    Each frame is captured at no more than `max_height` pixels, mapped to
+    the fixed PALETTE (one byte per pixel) and zlib-compressed; a frame
+    identical to the previous one only extends that frame's duration.
+    Frames older than `seconds`, or beyond `max_bytes` in total, are
+    dropped. The capture interval stretches automatically, without an
+    upper limit, so the thread's own CPU time stays under CPU_BUDGET;
+    past COARSE_INTERVAL this is logged once. Frames are grabbed through
+    CaptureManager.capture_scaled(), which prefers a backend that shrinks
+    while copying.
+
+    Configured from the environment (off unless OCP_REPLAY_SECONDS > 0):
+        OCP_REPLAY_SECONDS   length of the ring in seconds
+        OCP_REPLAY_FPS       target frames per second (default 1.5)
+        OCP_REPLAY_HEIGHT    frame height in pixels (default 540)
+        OCP_REPLAY_MAX_MB    memory cap for stored frames (default 8)
+        OCP_REPLAY_FORMAT    clip format, gif (default) or webp
+    """
+
+    def __init__(self, seconds=None, fps=None, max_height=None, max_bytes=None, grab=None):
+        self.seconds = float(seconds if seconds is not None else os.environ.get("OCP_REPLAY_SECONDS", 0))
+        self.fps = float(fps if fps is not None else os.environ.get("OCP_REPLAY_FPS", DEFAULT_FPS))
+        self.max_height = int(max_height if max_height is not None
+                              else os.environ.get("OCP_REPLAY_HEIGHT", DEFAULT_HEIGHT))
+        if max_bytes is None:
+            max_bytes = float(os.environ.get("OCP_REPLAY_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024
+        self.max_bytes = int(max_bytes)
+        self._grab = grab or (lambda: get_capture_manager().capture_scaled(self.max_height))
+        self._frames = collections.deque()
+        self._bytes = 0
+        self._last_digest = None
+        self._cost = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.seconds > 0 and self.fps > 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def interval(self):
+        """Seconds between captures: 1 / fps, stretched as far as needed to keep within CPU_BUDGET."""
+        return max(1.0 / self.fps, self._cost / CPU_BUDGET)
+
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.running:
+            self._thread.join(timeout=2)
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+            self._last_digest = None
+
+    def _run(self):
+        first = True
+        coarse = False
+        while not self._stop.is_set():
+            start = time.thread_time()
+            try:
+                self.add_frame(self._grab())
+            except Exception as e:
+                print(f"[ReplayBuffer] Capture failed: {e}")
+            cost = time.thread_time() - start
+            if first:
+                first = False
+            else:
+                self._cost = cost if not self._cost else 0.8 * self._cost + 0.2 * cost
+            interval = self.interval
+            if interval > COARSE_INTERVAL and not coarse:
+                coarse = True
+                print(f"[ReplayBuffer] Capture costs {self._cost * 1000:.0f} ms of CPU; "
+                      f"one frame every {interval:.1f}s to stay within budget.")
+            self._stop.wait(interval)
+
+    def add_frame(self, img, now=None):
+        """Store one screen image (any size; shrunk to max_height if needed)."""
+        if img is None:
+            return
+        now = time.monotonic() if now is None else now
+        if img.height > self.max_height:
+            img = img.resize((max(1, img.width * self.max_height // img.height), self.max_height),
+                             Image.BILINEAR)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        pal = img.quantize(palette=PALETTE, dither=Image.Dither.NONE)
+        raw = pal.tobytes()
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+
+        with self._lock:
+            if digest == self._last_digest and self._frames:
+                self._frames[-1][1] = now
+            else:
+                data = zlib.compress(raw, 1)
+                self._frames.append([now, now, pal.size, data])
+                self._bytes += len(data)
+                self._last_digest = digest
+            self._evict(now)
+
+    def _evict(self, now):
+        while self._frames and (self._bytes > self.max_bytes
+                                or (len(self._frames) > 1 and self._frames[1][0] < now - self.seconds)):
+            self._bytes -= len(self._frames.popleft()[3])
+
+    def stats(self):
+        with self._lock:
+            span = self._frames[-1][1] - self._frames[0][0] if self._frames else 0.0
+            return {"frames": len(self._frames), "bytes": self._bytes, "seconds": round(span, 1),
+                    "interval": round(self.interval, 2)}
+
+    def snapshot(self):
+        """The stored frames as (start, end, size, compressed bytes) tuples, oldest first."""
+        with self._lock:
+            return [tuple(frame) for frame in self._frames]
+
+    def encode_clip(self, fmt=None):
+        """Encode the current ring on the encoder thread; returns a ClipJob, or None if empty."""
+        frames = self.snapshot()
+        if not frames:
+            return None
+        return ClipJob(frames, fmt)
+
+
+def encode_clip(frames, fmt=None):
+    """Encode stored frames into an animated GIF (or WebP). Returns an AttachmentBuffer."""
+    fmt = (fmt or os.environ.get("OCP_REPLAY_FORMAT", "gif")).lower()
+    if fmt == "webp" and not features.check("webp"):
+        fmt = "gif"
+    start = time.perf_counter()
+    images, durations = [], []
+    for i, (begin, end, size, data) in enumerate(frames):
+        img = Image.frombytes("P", size, zlib.decompress(data))
+        img.putpalette(PALETTE.getpalette())
+        images.append(img)
+        next_begin = frames[i + 1][0] if i + 1 < len(frames) else end
+        durations.append(max(100, int((max(next_begin, end) - begin) * 1000)))
+
+    buf = io.BytesIO()
+    if fmt == "gif":
+        images[0].save(buf, format="GIF", save_all=True, append_images=images[1:],
+                       duration=durations, loop=0)
+        mime_type = "image/gif"
+    else:
+        images = [img.convert("RGB") for img in images]
+        images[0].save(buf, format="WEBP", save_all=True, append_images=images[1:],
+                       duration=durations, loop=0, quality=60, method=4)
+        mime_type = "image/webp"
+    buf.seek(0)
+    params = {"format": fmt, "frames": len(images), "seconds": round(sum(durations) / 1000, 1),
+              "size": buf.getbuffer().nbytes, "ms": round((time.perf_counter() - start) * 1000)}
+    print(f"[ReplayBuffer] Encoded clip: {params}")
+    return AttachmentBuffer(buf, f"replay.{fmt}", mime_type, params)
+
+
+class ClipJob(EncoderJob):
+    """A replay clip encode on the shared encoder thread; same interface as EncodeJob."""
+
+    def __init__(self, frames, fmt=None):
+        self._frames = frames
+        self._fmt = fmt
+        super().__init__()
+
+    def _run(self):
+        frames, self._frames = self._frames, None
+        if self._cancelled.is_set() or not frames:
+            return None
+        attachment = encode_clip(frames, self._fmt)
+        if self._cancelled.is_set():
+            attachment.close()
+            return None
+        return [attachment]
+
+    def cancel(self):
+        super().cancel()
+        self._frames = None
+
+
+_replay = None
+
+
+def get_replay():
+    global _replay
+    if _replay is None:
+        _replay = ReplayBuffer()
+    return _replay
@@ -0,0 +1,196 @@
+"""Retry policy, per-endpoint circuit breakers and their metrics for the HappyFox client."""
+
+import collections
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+FAILURE_THRESHOLD = int(os.environ.get("OCP_BREAKER_FAILURES", 5))
+RESET_TIMEOUT = float(os.environ.get("OCP_BREAKER_RESET", 30))
+MAX_RESET_TIMEOUT = 600.0
+RETRY_ATTEMPTS = int(os.environ.get("OCP_RETRY_ATTEMPTS", 3))
+RETRY_BASE = 0.5
+RETRY_CAP = 8.0
+MAX_RETRY_WAIT = 15.0
+MAX_RETRY_AFTER = 3600.0
+TRANSITION_HISTORY = 20
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return None
+    return max(0.0, min(seconds, MAX_RETRY_AFTER))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped, honouring Retry-After.
+
+    delay(n) for the n-th retry (1-based) is uniform in
+    [0, min(cap, base * 2 ** n)], so a fleet of agents that failed
+    together spreads its retries out instead of retrying in lockstep. A
+    server-supplied Retry-After replaces the computed delay; when it is
+    longer than max_wait the caller should give up inline (and spool)
+    rather than sleep.
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base=RETRY_BASE, cap=RETRY_CAP, max_wait=MAX_RETRY_WAIT):
+        self.attempts = max(1, attempts)
+        self.base = base
+        self.cap = cap
+        self.max_wait = max_wait
+
+    def delay(self, retry, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.cap, self.base * 2 ** retry))
+
+
+class CircuitOpen(Exception):
+    """Raised by CircuitBreaker.check() while the endpoint is failing fast."""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"{endpoint} unavailable; retrying in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Fails fast for one endpoint after repeated failures.
+
+    Closed: requests flow; `failure_threshold` consecutive failures open
+    it. Open: check() raises CircuitOpen until the reset timeout passes,
+    then one trial request is let through (half-open; another is allowed
+    if the trial never reports back). Success closes the breaker; failure
+    re-opens it with the timeout doubled (up to MAX_RESET_TIMEOUT). A
+    Retry-After from the server also blocks the endpoint until then,
+    whatever the state.
+    """
+
+    def __init__(self, endpoint, metrics=None, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.metrics = metrics
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._timeout = reset_timeout
+        self._blocked_until = 0.0
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Seconds until a request may be attempted (0 if allowed now)."""
+        with self._lock:
+            return max(0.0, self._blocked_until - time.monotonic())
+
+    def check(self):
+        """Raise CircuitOpen unless a request may go out now."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                raise CircuitOpen(self.endpoint, self._blocked_until - now)
+            if self.state == OPEN:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_at is not None and now - self._trial_at < self._timeout:
+                    raise CircuitOpen(self.endpoint, self._trial_at + self._timeout - now)
+                self._trial_at = now
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_at = None
+            self._timeout = self.reset_timeout
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self.failures += 1
+            self._trial_at = None
+            if self.state == HALF_OPEN:
+                self._timeout = min(MAX_RESET_TIMEOUT, self._timeout * 2)
+                self._transition(OPEN)
+                self._blocked_until = now + self._timeout
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._transition(OPEN)
+                self._blocked_until = now + self._timeout
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def _transition(self, state):
+        old, self.state = self.state, state
+        print(f"[CircuitBreaker] {self.endpoint}: {old} -> {state}")
+        if self.metrics is not None:
+            self.metrics.transition(self.endpoint, old, state)
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures,
+                    "retry_in": round(max(0.0, self._blocked_until - time.monotonic()), 1)}
+
+
+class ResilienceMetrics:
+    """Counters (attempts, retries, failures, fail-fasts) and recent breaker transitions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.transitions = collections.deque(maxlen=TRANSITION_HISTORY)
+
+    def count(self, name, endpoint=None, n=1):
+        with self._lock:
+            self.counters[name] += n
+            if endpoint:
+                self.counters[f"{name}:{endpoint}"] += n
+
+    def transition(self, endpoint, old, new):
+        with self._lock:
+            self.counters[f"breaker_{new}"] += 1
+            self.transitions.append((time.time(), endpoint, old, new))
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self.counters), "transitions": list(self.transitions)}
+
+
+_metrics = ResilienceMetrics()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_metrics():
+    return _metrics
+
+
+def get_breaker(endpoint):
+    """The shared breaker for `endpoint` (a URL without query string), created on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint, _metrics)
+        return breaker
+
+
+def stats():
+    """Breaker states and counters, for the GUI, the spool drainer and logging."""
+    with _breakers_lock:
+        breakers = {endpoint: b.snapshot() for endpoint, b in _breakers.items()}
+    return {"breakers": breakers, **_metrics.snapshot()}
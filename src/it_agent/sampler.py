@@ -0,0 +1,163 @@
+"""Background CPU / memory sampler with O(1) reads."""
+
+import threading
+from array import array
+from collections import deque
+import psutil
+
+SAMPLE_INTERVAL = 1.0
+HISTORY_SECONDS = 300
+AVERAGE_SECONDS = 60
+
+
+class _Series:
+    """Fixed-size ring of float samples with a sliding average and a window peak.
+
+    The ring holds the full peak window; the average covers the most
+    recent `avg_len` samples. Both are maintained incrementally on every
+    push so reads never scan the ring.
+    """
+
+    def __init__(self, size, avg_len):
+        self.size = size
+        self.avg_len = min(avg_len, size)
+        self.values = array("f", bytes(4 * size))
+        self.count = 0
+        self.seq = 0
+        self.avg_sum = 0.0
+        self._peaks = deque()
+
+    def push(self, value):
+        pos = self.seq % self.size
+        if self.count >= self.avg_len:
+            self.avg_sum -= self.values[(self.seq - self.avg_len) % self.size]
+        self.values[pos] = value
+        self.avg_sum += self.values[pos]
+        self.count = min(self.count + 1, self.size)
+
+        while self._peaks and self._peaks[-1][1] <= value:
+            self._peaks.pop()
+        self._peaks.append((self.seq, value))
+        while self._peaks[0][0] <= self.seq - self.size:
+            self._peaks.popleft()
+        self.seq += 1
+
+    def current(self):
+        if not self.count:
+            return None
+        return self.values[(self.seq - 1) % self.size]
+
+    def average(self):
+        n = min(self.count, self.avg_len)
+        return self.avg_sum / n if n else None
+
+    def peak(self):
+        return self._peaks[0][1] if self._peaks else None
+
+
+class MetricsSampler:
+    """Samples total and per-core CPU, RAM and swap on a daemon thread."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=HISTORY_SECONDS, average=AVERAGE_SECONDS):
+        self.interval = interval
+        size = max(1, int(history / interval))
+        avg_len = max(1, int(average / interval))
+        try:
+            self.cores = psutil.cpu_count(logical=True) or 1
+        except Exception:
+            self.cores = 1
+        self.cpu = _Series(size, avg_len)
+        self.ram = _Series(size, avg_len)
+        self.swap = _Series(size, avg_len)
+        self.per_core = [_Series(size, avg_len) for _ in range(self.cores)]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        psutil.cpu_percent(interval=None, percpu=True)
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_listener(self, callback):
+        """Register callback(sampler) to run on the sampler thread after each sample."""
+        self._listeners.append(callback)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"[MetricsSampler] Sample failed: {e}")
+            for callback in list(self._listeners):
+                try:
+                    callback(self)
+                except Exception as e:
+                    print(f"[MetricsSampler] Listener failed: {e}")
+
+    def _sample(self):
+        cores = psutil.cpu_percent(interval=None, percpu=True)
+        ram = psutil.virtual_memory().percent
+        try:
+            swap = psutil.swap_memory().percent
+        except Exception:
+            swap = 0.0
+        total = sum(cores) / len(cores) if cores else 0.0
+
+        with self._lock:
+            self.cpu.push(total)
+            self.ram.push(ram)
+            self.swap.push(swap)
+            for series, value in zip(self.per_core, cores):
+                series.push(value)
+
+    def has_data(self):
+        return self.cpu.count > 0
+
+    def snapshot(self):
+        """Return current, 1-minute average and 5-minute peak readings."""
+        with self._lock:
+            return {
+                "cpu_current": _round(self.cpu.current()),
+                "cpu_avg_1m": _round(self.cpu.average()),
+                "cpu_peak_5m": _round(self.cpu.peak()),
+                "ram_current": _round(self.ram.current()),
+                "ram_avg_1m": _round(self.ram.average()),
+                "ram_peak_5m": _round(self.ram.peak()),
+                "swap_current": _round(self.swap.current()),
+                "swap_peak_5m": _round(self.swap.peak()),
+                "cpu_per_core": [_round(s.current()) for s in self.per_core],
+                "cpu_per_core_avg_1m": [_round(s.average()) for s in self.per_core],
+            }
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+_sampler = None
+
+
+def get_sampler():
+    """Return the process-wide sampler (created but not started on first use)."""
+    global _sampler
+    if _sampler is None:
+        _sampler = MetricsSampler()
+    return _sampler
+
+
+def start_sampler():
+    sampler = get_sampler()
+    sampler.start()
+    return sampler
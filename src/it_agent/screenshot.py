@@ -1,39 +1,492 @@
-"""Screenshot capture utilities."""
+"""Screenshot capture, background encoding and thumbnail utilities."""
 
+import copy
 import io
-from PIL import Image
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, features
+from src.it_agent.attachments import AttachmentBuffer
+from src.it_agent.capture import dpi_aware, get_capture_manager, get_monitors
+from src.it_agent.sysinfo import get_active_window_rect
 
+FORMATS = {
+    "png": ("PNG", "png", "image/png"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
 
-def capture_screenshot():
-    """Capture a full-screen screenshot and return it as bytes in a BytesIO buffer.
-    
-    Tries pyautogui first, then falls back to PIL.ImageGrab.
-    Returns (BytesIO buffer, PIL.Image) or (None, None) on failure.
+CAPTURE_MODES = {
+    "window": "Window",
+    "monitor": "Monitor",
+    "all": "All screens",
+}
+
+THUMBNAIL_HEIGHT = 110
+REDUCING_GAP = 2
+
+PIXELATE_BLOCK = 16
+
+BUDGET_WORK_PIXELS = 1_000_000
+BUDGET_MAX_QUALITY = 90
+BUDGET_TEXT_QUALITY = 60
+BUDGET_MIN_QUALITY = 35
+BUDGET_MIN_SCALE = 0.5
+BUDGET_MAX_ENCODES = 3
+
+ENCODE_WORKERS = int(os.environ.get("OCP_ENCODE_WORKERS", min(4, os.cpu_count() or 1)))
+
+_encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+_parts_pool = None
+
+
+def _get_parts_pool():
+    """Worker pool for encoding monitors in parallel; created once and reused across tickets."""
+    global _parts_pool
+    if _parts_pool is None:
+        _parts_pool = ThreadPoolExecutor(max_workers=max(1, ENCODE_WORKERS), thread_name_prefix="encode-part")
+    return _parts_pool
+
+
+def redaction_style():
+    """How redacted regions are hidden: OCP_REDACTION_STYLE = fill (default, black) or pixelate."""
+    style = os.environ.get("OCP_REDACTION_STYLE", "fill").strip().lower()
+    return style if style in ("fill", "pixelate") else "fill"
+
+
+def split_monitors():
+    """Whether an all-screens capture is encoded (and attached) per monitor; OCP_SPLIT_MONITORS, default on."""
+    return os.environ.get("OCP_SPLIT_MONITORS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+class EncoderConfig:
+    """Screenshot output format and its CPU / size trade-off knobs.
+
+    Defaults come from the environment:
+        OCP_SCREENSHOT_FORMAT   png (default), jpeg or webp
+        OCP_PNG_COMPRESS_LEVEL  0-9, PNG only (default 6)
+        OCP_SCREENSHOT_QUALITY  1-100, JPEG / WebP only (default 85)
+        OCP_SCREENSHOT_BUDGET   target size in bytes; when set, format,
+                                quality and scale are chosen to fit it
+                                (default 0, off)
     """
-    img = None
-    try:
-        import pyautogui
-        img = pyautogui.screenshot()
-    except Exception:
-        try:
-            from PIL import ImageGrab
-            img = ImageGrab.grab()
-        except Exception:
-            return None, None
 
-    if img is None:
-        return None, None
+    def __init__(self, fmt=None, compress_level=None, quality=None, budget=None):
+        fmt = (fmt or os.environ.get("OCP_SCREENSHOT_FORMAT", "png")).lower()
+        self.format = "jpeg" if fmt == "jpg" else fmt
+        if self.format not in FORMATS:
+            print(f"[Screenshot] Unknown format '{fmt}', using PNG.")
+            self.format = "png"
+        self.compress_level = int(compress_level if compress_level is not None
+                                  else os.environ.get("OCP_PNG_COMPRESS_LEVEL", 6))
+        self.quality = int(quality if quality is not None
+                           else os.environ.get("OCP_SCREENSHOT_QUALITY", 85))
+        self.budget = int(budget if budget is not None
+                          else os.environ.get("OCP_SCREENSHOT_BUDGET", 0))
+
+    @property
+    def filename(self):
+        return f"screenshot.{FORMATS[self.format][1]}"
+
+    @property
+    def mime_type(self):
+        return FORMATS[self.format][2]
+
+    def save_kwargs(self):
+        if self.format == "png":
+            return {"compress_level": self.compress_level}
+        return _lossy_kwargs(self.format, self.quality)
+
+
+def _lossy_kwargs(fmt, quality, text=False):
+    if fmt == "jpeg":
+        kwargs = {"quality": quality, "optimize": True, "progressive": True}
+        if text:
+            kwargs["subsampling"] = 0
+        return kwargs
+    return {"quality": quality, "method": 4}
+
 
+def encode_image(img, config=None):
+    """Encode a PIL Image with the given config.
+
+    Returns (BytesIO buffer, filename, mime type).
+    """
+    config = config or EncoderConfig()
+    if config.format == "jpeg" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
     buf = io.BytesIO()
-    img.save(buf, format="PNG")
+    img.save(buf, format=FORMATS[config.format][0], **config.save_kwargs())
     buf.seek(0)
-    return buf, img
+    return buf, config.filename, config.mime_type
+
+
+def encode_to_budget(img, config):
+    """Encode `img` to fit in config.budget bytes, choosing format, quality and scale.
+
+    Sizes are predicted from a working copy reduced to about
+    BUDGET_WORK_PIXELS, scaled by pixel count and by a detail correction
+    (reduction softens text, which then compresses better), so the
+    search costs a few small encodes; the full frame is encoded once, or
+    again (at most BUDGET_MAX_ENCODES times) if the prediction was off. Lossless PNG is
+    used when it is predicted to fit. Otherwise the lossy format (WebP,
+    else JPEG without chroma subsampling) keeps quality at or above
+    BUDGET_TEXT_QUALITY and shrinks the scale first, down to
+    BUDGET_MIN_SCALE, so text stays legible. Below that it lowers the
+    quality to BUDGET_MIN_QUALITY, and if that still does not fit the
+    result is sent over budget rather than unreadable.
+
+    Returns (BytesIO buffer, filename, mime type, params dict).
+    """
+    start = time.perf_counter()
+    budget = config.budget
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    factor = max(1, math.ceil(math.sqrt(img.width * img.height / BUDGET_WORK_PIXELS)))
+    work = img.reduce(factor) if factor > 1 else img
+    pixel_ratio = (img.width * img.height) / (work.width * work.height)
+    work_sizes = {}
+
+    def work_size(fmt, quality):
+        if (fmt, quality) not in work_sizes:
+            buf = io.BytesIO()
+            if fmt == "png":
+                work.save(buf, format="PNG", compress_level=config.compress_level)
+            else:
+                work.save(buf, format=FORMATS[fmt][0], **_lossy_kwargs(fmt, quality, text=True))
+            work_sizes[(fmt, quality)] = buf.tell() * pixel_ratio
+        return work_sizes[(fmt, quality)]
+
+    def best_quality(fmt, lo, hi, limit):
+        best = None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if work_size(fmt, mid) <= limit:
+                best, lo = mid, mid + 1
+            else:
+                hi = mid - 1
+        return best
+
+    def plan(fmt, correction):
+        limit = budget / correction
+        quality = best_quality(fmt, BUDGET_TEXT_QUALITY, BUDGET_MAX_QUALITY, limit)
+        if quality is not None:
+            return quality, 1.0
+        scale = math.sqrt(limit / work_size(fmt, BUDGET_TEXT_QUALITY))
+        if scale >= BUDGET_MIN_SCALE:
+            return BUDGET_TEXT_QUALITY, math.floor(scale * 100) / 100
+        limit /= BUDGET_MIN_SCALE ** 2
+        quality = best_quality(fmt, BUDGET_MIN_QUALITY, BUDGET_TEXT_QUALITY - 1, limit)
+        return quality or BUDGET_MIN_QUALITY, BUDGET_MIN_SCALE
+
+    def encode(fmt, quality, scale):
+        target = img
+        if scale < 1.0:
+            target = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+        buf = io.BytesIO()
+        if fmt == "png":
+            target.save(buf, format="PNG", compress_level=config.compress_level)
+        else:
+            target.save(buf, format=FORMATS[fmt][0], **_lossy_kwargs(fmt, quality, text=True))
+        buf.seek(0)
+        return buf
+
+    full_encodes = 0
+    buf = None
+    fmt, quality, scale = "png", None, 1.0
+    if work_size("png", None) <= budget:
+        buf = encode(fmt, quality, scale)
+        full_encodes += 1
+        if buf.getbuffer().nbytes > budget:
+            buf = None
+
+    if buf is None:
+        fmt = "webp" if features.check("webp") else "jpeg"
+        correction = _detail_correction(img, factor, fmt) if factor > 1 else 1.0
+        while True:
+            quality, scale = plan(fmt, correction)
+            buf = encode(fmt, quality, scale)
+            full_encodes += 1
+            size = buf.getbuffer().nbytes
+            if size <= budget or full_encodes >= BUDGET_MAX_ENCODES:
+                break
+            predicted = work_size(fmt, quality) * scale * scale
+            correction = max(correction * 1.05, size / predicted)
+            if (quality, scale) == (BUDGET_MIN_QUALITY, BUDGET_MIN_SCALE):
+                break
+
+    size = buf.getbuffer().nbytes
+    params = {
+        "format": fmt,
+        "quality": quality,
+        "scale": scale,
+        "size": size,
+        "budget": budget,
+        "fits": size <= budget,
+        "trial_encodes": len(work_sizes),
+        "full_encodes": full_encodes,
+        "ms": round((time.perf_counter() - start) * 1000),
+    }
+    return buf, f"screenshot.{FORMATS[fmt][1]}", FORMATS[fmt][2], params
+
+
+def _detail_correction(img, factor, fmt):
+    """Ratio of real to predicted encoded size, measured on a centred full-resolution crop."""
+    side = min(img.width, img.height, 512) // factor * factor
+    left, top = (img.width - side) // 2, (img.height - side) // 2
+    crop = img.crop((left, top, left + side, top + side))
+    sizes = []
+    for sample in (crop, crop.reduce(factor)):
+        buf = io.BytesIO()
+        sample.save(buf, format=FORMATS[fmt][0], **_lossy_kwargs(fmt, BUDGET_TEXT_QUALITY, text=True))
+        sizes.append(buf.tell())
+    return max(1.0, sizes[0] / (sizes[1] * factor * factor))
+
+
+def describe_encoding(params):
+    """One-line summary of how a screenshot was encoded, for logs and the ticket body."""
+    if not params:
+        return "N/A"
+    parts = [params["format"].upper()]
+    if params.get("quality") is not None:
+        parts.append(f"q{params['quality']}")
+    if params.get("scale", 1.0) < 1.0:
+        parts.append(f"{params['scale']:.0%} scale")
+    parts.append(f"{params['size'] / 1024:.0f} KB")
+    if params.get("redacted"):
+        n = params["redacted"]
+        parts.append(f"({n} region{'s' if n != 1 else ''} redacted)")
+    if params.get("budget"):
+        note = "" if params["fits"] else ", over budget"
+        parts.append(f"(budget {params['budget'] / 1024:.0f} KB{note}, "
+                     f"{params['trial_encodes']} trial + {params['full_encodes']} full encodes)")
+    parts.append(f"in {params['ms']} ms")
+    return " ".join(parts)
+
+
+def redact(img, boxes, style="fill"):
+    """Black out or pixelate `boxes` of `img` in place.
+
+    Only the boxes are touched: each one's original pixels are cropped
+    and returned as (box, patch) pairs so restore() can undo the change,
+    which keeps an image shared with the held Frame pristine without
+    copying the whole frame.
+    """
+    saved = []
+    for box in boxes:
+        patch = img.crop(box)
+        saved.append((box, patch))
+        if style == "pixelate":
+            block = max(PIXELATE_BLOCK, min(patch.size) // 8)
+            img.paste(patch.reduce(block).resize(patch.size, Image.NEAREST), box)
+        else:
+            img.paste((0,) * len(img.getbands()), box)
+    return saved
+
 
+def restore(img, saved):
+    """Put back the patches returned by redact()."""
+    for box, patch in reversed(saved):
+        img.paste(patch, box)
 
-def image_to_thumbnail(img, max_height=150):
-    """Resize a PIL Image to a thumbnail with the given max height, preserving aspect ratio."""
+
+def _encode_one(img, config):
+    """Encode one image per `config`; returns (BytesIO, filename, mime type, params)."""
+    start = time.perf_counter()
+    if config.budget > 0:
+        return encode_to_budget(img, config)
+    buf, filename, mime_type = encode_image(img, config)
+    params = {
+        "format": config.format,
+        "quality": None if config.format == "png" else config.quality,
+        "size": buf.getbuffer().nbytes,
+        "ms": round((time.perf_counter() - start) * 1000),
+    }
+    return buf, filename, mime_type, params
+
+
+class EncoderJob:
+    """Work queued on the shared encoder thread, with cancel / close / result.
+
+    Subclasses set up their inputs and then call super().__init__(),
+    which queues self._run(); _run() returns a list of AttachmentBuffer
+    (or None) and should drop its inputs once it has them.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._future = _encode_pool.submit(self._run)
+
+    def _run(self):
+        raise NotImplementedError
+
+    def cancel(self):
+        self._cancelled.set()
+        self._future.cancel()
+
+    def close(self):
+        """Cancel the job and release the encoded attachments, if any."""
+        self.cancel()
+        if self._future.done() and not self._future.cancelled() and self._future.exception() is None:
+            for attachment in self._future.result() or []:
+                attachment.close()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """Wait for the encode. Returns a list of AttachmentBuffer, or None if cancelled."""
+        if self._future.cancelled():
+            return None
+        return self._future.result(timeout=timeout)
+
+
+class EncodeJob(EncoderJob):
+    """A screenshot encode running on the background encoder thread.
+
+    `images` is one image or a list of parts (one per monitor). Several
+    parts are encoded concurrently on the shared parts pool (Pillow
+    releases the GIL while compressing) and become one attachment each;
+    a byte budget is shared between them by pixel count. `redactions`
+    holds one list of boxes per part; they are hidden on the encoder
+    thread just before encoding and restored afterwards.
+
+    The job holds the only references to the images it encodes and drops
+    them once finished. cancel() skips the encode if it has not started,
+    and a cancelled job's result() returns None. close() also frees the
+    encoded attachments.
+    """
+
+    def __init__(self, images, config=None, redactions=None):
+        self.config = config or EncoderConfig()
+        self._images = images if isinstance(images, list) else [images]
+        self._redactions = redactions or [[] for _ in self._images]
+        super().__init__()
+
+    def _run(self):
+        images, self._images = self._images, None
+        if self._cancelled.is_set() or not images:
+            return None
+        style = redaction_style()
+        saved = [redact(img, boxes, style) for img, boxes in zip(images, self._redactions)]
+        try:
+            results = self._encode(images)
+        finally:
+            for img, patches in zip(images, saved):
+                restore(img, patches)
+        del images, saved
+
+        attachments = []
+        for i, (buf, filename, mime_type, params) in enumerate(results, 1):
+            if len(results) > 1:
+                root, ext = os.path.splitext(filename)
+                filename = f"{root}-{i}{ext}"
+                params["part"] = i
+            params["redacted"] = len(self._redactions[i - 1])
+            attachments.append(AttachmentBuffer(buf, filename, mime_type, params))
+            print(f"[Screenshot] Encoded {filename}: {describe_encoding(params)}")
+        if self._cancelled.is_set():
+            for attachment in attachments:
+                attachment.close()
+            return None
+        return attachments
+
+    def _encode(self, images):
+        if len(images) == 1:
+            return [_encode_one(images[0], self.config)]
+        total = sum(img.width * img.height for img in images)
+        pool = _get_parts_pool()
+        futures = []
+        for img in images:
+            config = self.config
+            if config.budget > 0:
+                config = copy.copy(config)
+                config.budget = int(self.config.budget * img.width * img.height / total)
+            futures.append(pool.submit(_encode_one, img, config))
+        return [f.result() for f in futures]
+
+    def cancel(self):
+        super().cancel()
+        self._images = None
+
+
+def encode_frame(frame, config=None):
+    """Start encoding the frame's current mode, split per monitor if enabled, with its redactions."""
+    if frame.released:
+        return EncodeJob([], config)
+    boxes = frame.part_boxes() if split_monitors() else [frame.box_for(frame.mode)]
+    return EncodeJob([frame.region(box) for box in boxes], config,
+                     [frame.redactions_in(box) for box in boxes])
+
+
+def default_capture_mode():
+    """Capture mode from OCP_CAPTURE_MODE: window, monitor (default) or all."""
+    mode = os.environ.get("OCP_CAPTURE_MODE", "monitor").strip().lower()
+    return mode if mode in CAPTURE_MODES else "monitor"
+
+
+def grab_frame():
+    """Capture the whole desktop as a Frame, or None on failure.
+
+    Uses the calibrated capture backend, falling back through the others.
+    The foreground window and monitor layout are recorded on the frame so
+    any capture mode can be cut from it later.
+    """
+    frame = get_capture_manager().capture()
+    if frame is None:
+        return None
+    with dpi_aware():
+        frame.window_rect = get_active_window_rect()
+    frame.monitors = get_monitors()
+    return frame
+
+
+def capture_screenshot(mode=None, config=None):
+    """Capture the desktop and start encoding the `mode` region in the background.
+
+    Returns (EncodeJob, Frame) or (None, None) on failure. frame.image is
+    the region being encoded; frame.select() cuts another mode from the
+    same capture. The encoded attachment is awaited with job.result()
+    only when needed; frame.release() drops the capture once no more mode
+    switches are possible.
+    """
+    frame = grab_frame()
+    if frame is None:
+        return None, None
+    frame.select(mode or default_capture_mode())
+    job = encode_frame(frame, config)
+    frame.thumbnail = image_to_thumbnail(frame.image)
+    return job, frame
+
+
+def submit_encode(func, *args):
+    """Run func(*args) on the encoder thread, after any encode already queued; returns a Future."""
+    return _encode_pool.submit(func, *args)
+
+
+def submit_thumbnail(frame, max_height=THUMBNAIL_HEIGHT):
+    """Cut and shrink the frame's current mode on the encoder thread; returns a Future of the thumbnail."""
+    return submit_encode(lambda: image_to_thumbnail(frame.image, max_height))
+
+
+def image_to_thumbnail(img, max_height=THUMBNAIL_HEIGHT):
+    """Resize a PIL Image to a thumbnail with the given max height, preserving aspect ratio.
+
+    Shrinks by an integer factor with reduce() (a cheap box average) down
+    to about REDUCING_GAP times the target, then does one LANCZOS resample
+    on the small intermediate instead of filtering the full frame.
+    """
     if img is None:
         return None
     ratio = max_height / img.height
-    new_width = int(img.width * ratio)
+    new_width = max(1, int(img.width * ratio))
+    factor = img.height // (max_height * REDUCING_GAP)
+    if factor > 1:
+        img = img.reduce(factor)
     return img.resize((new_width, max_height), Image.LANCZOS)
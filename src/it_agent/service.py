@@ -25,6 +25,7 @@ Debug (foreground):
 import os
 import sys
 import time
+import threading
 import subprocess
 import logging
 import logging.handlers
@@ -44,6 +45,15 @@ try:
 except ImportError:
     pass
 
+if not getattr(sys, 'frozen', False):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from src.it_agent.shared_snapshot import SnapshotPublisher, default_snapshot_path
+    from src.it_agent.sysinfo import gather_machine_inventory
+except ImportError:
+    SnapshotPublisher = None
+
 
 SERVICE_NAME = "OCPITHelpdesk"
 SERVICE_DISPLAY = "OCP IT Helpdesk"
@@ -52,6 +62,7 @@ SERVICE_DESC = "OCP IT Helpdesk - Background desktop agent for IT support ticket
 RESTART_DELAY = 5
 POLL_INTERVAL = 3
 SESSION_WAIT = 10
+INVENTORY_INTERVAL = 60
 
 
 def _get_install_dir():
@@ -89,11 +100,13 @@ class OCPHelpdeskService(win32serviceutil.ServiceFramework):
         self.is_alive = True
         self.child_process = None
         self.log = _setup_logging()
+        self._inventory_stop = threading.Event()
 
     def SvcStop(self):
         self.log.info("Service stop requested.")
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         self.is_alive = False
+        self._inventory_stop.set()
         self._kill_child()
         win32event.SetEvent(self.hWaitStop)
 
@@ -105,8 +118,33 @@ class OCPHelpdeskService(win32serviceutil.ServiceFramework):
         )
         self.log.info("Service started.")
         self.ReportServiceStatus(win32service.SERVICE_RUNNING)
+        if SnapshotPublisher is not None:
+            threading.Thread(target=self._inventory_loop, daemon=True).start()
+        else:
+            self.log.warning("Inventory publishing unavailable (src.it_agent not importable).")
         self._main_loop()
 
+    def _inventory_loop(self):
+        """Collect machine inventory on a schedule and publish it for the tray app."""
+        try:
+            path = default_snapshot_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            publisher = SnapshotPublisher(path)
+        except Exception as e:
+            self.log.error("Cannot open inventory snapshot: %s", e)
+            return
+
+        self.log.info("Publishing inventory to %s every %ds", path, INVENTORY_INTERVAL)
+        try:
+            while not self._inventory_stop.is_set():
+                try:
+                    publisher.publish(gather_machine_inventory())
+                except Exception as e:
+                    self.log.warning("Inventory publish failed: %s", e)
+                self._inventory_stop.wait(INVENTORY_INTERVAL)
+        finally:
+            publisher.close()
+
     def _main_loop(self):
         install_dir = _get_install_dir()
         app_exe = os.path.join(install_dir, "OCP_IT_Helpdesk.exe")
@@ -0,0 +1,175 @@
+"""Versioned, memory-mapped snapshot file shared between the service and the tray app.
+
+The service (writer) publishes a JSON document into one of two fixed
+slots and flips the active slot; the tray app (reader) maps the same
+file read-only and decodes the active slot straight from the mapping.
+A sequence counter in the header (a seqlock) lets the reader detect a
+publish that raced with its read and retry, so neither side takes a
+lock. The layout is plain mmap over a regular file and works the same
+on Windows and Linux.
+
+Header layout (little-endian, HEADER_SIZE bytes):
+    0   4s  magic "OCPS"
+    4   H   layout version
+    8   I   slot size in bytes
+    16  Q   sequence (odd while a publish is in progress)
+    24  d   published_at (unix time)
+    32  I   active slot (0 or 1)
+    36  I   payload length of slot 0
+    40  I   payload length of slot 1
+"""
+
+import json
+import mmap
+import os
+import platform
+import struct
+import time
+from src.it_agent.paths import APP_DIR_NAME, program_data_dir
+
+MAGIC = b"OCPS"
+VERSION = 1
+HEADER_SIZE = 64
+DEFAULT_SLOT_SIZE = 64 * 1024
+SNAPSHOT_FILE = "inventory.snap"
+
+_MAGIC = struct.Struct("<4sH")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_F64 = struct.Struct("<d")
+
+OFF_SLOT_SIZE = 8
+OFF_SEQ = 16
+OFF_PUBLISHED = 24
+OFF_ACTIVE = 32
+OFF_LENGTHS = 36
+
+
+def default_snapshot_path():
+    """Machine-wide snapshot location (ProgramData on Windows, readable by all users)."""
+    if platform.system() == "Windows":
+        return os.path.join(os.environ.get("ProgramData", "C:\\ProgramData"), APP_DIR_NAME, SNAPSHOT_FILE)
+    return os.path.join(program_data_dir(), SNAPSHOT_FILE)
+
+
+class SnapshotPublisher:
+    """Writer side: owns the file and publishes dicts into alternating slots."""
+
+    def __init__(self, path, slot_size=DEFAULT_SLOT_SIZE):
+        self.path = path
+        self.slot_size = slot_size
+        size = HEADER_SIZE + 2 * slot_size
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self._file = open(path, mode)
+        if os.fstat(self._file.fileno()).st_size != size:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+        magic, version = _MAGIC.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or _U32.unpack_from(self._mm, OFF_SLOT_SIZE)[0] != slot_size:
+            self._mm[:HEADER_SIZE] = bytes(HEADER_SIZE)
+            _U32.pack_into(self._mm, OFF_SLOT_SIZE, slot_size)
+            _MAGIC.pack_into(self._mm, 0, MAGIC, VERSION)
+
+    def publish(self, data):
+        payload = json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+        if len(payload) > self.slot_size:
+            raise ValueError(f"Snapshot of {len(payload)} bytes exceeds slot size {self.slot_size}")
+
+        mm = self._mm
+        seq = _U64.unpack_from(mm, OFF_SEQ)[0]
+        slot = 1 - _U32.unpack_from(mm, OFF_ACTIVE)[0]
+        offset = HEADER_SIZE + slot * self.slot_size
+
+        _U64.pack_into(mm, OFF_SEQ, seq + 1)
+        mm[offset:offset + len(payload)] = payload
+        _U32.pack_into(mm, OFF_LENGTHS + 4 * slot, len(payload))
+        _F64.pack_into(mm, OFF_PUBLISHED, time.time())
+        _U32.pack_into(mm, OFF_ACTIVE, slot)
+        _U64.pack_into(mm, OFF_SEQ, seq + 2)
+        mm.flush()
+
+    def close(self):
+        try:
+            self._mm.close()
+        finally:
+            self._file.close()
+
+
+class SnapshotReader:
+    """Reader side: maps the file read-only and decodes the active slot without locking."""
+
+    def __init__(self, path, retries=50):
+        self.path = path
+        self.retries = retries
+        self._file = None
+        self._mm = None
+        self._view = None
+
+    def _open(self):
+        if self._mm is not None:
+            return True
+        try:
+            self._file = open(self.path, "rb")
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER_SIZE:
+                self.close()
+                return False
+            self._mm = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mm)
+            return True
+        except (OSError, ValueError):
+            self.close()
+            return False
+
+    def read(self):
+        """Return (data, published_at), or (None, 0.0) if nothing valid is published.
+
+        If the header no longer matches the mapping (the publisher was
+        restarted with another slot size) the file is re-opened once.
+        """
+        for _ in range(2):
+            if not self._open():
+                return None, 0.0
+            view = self._view
+            magic, version = _MAGIC.unpack_from(view, 0)
+            slot_size = _U32.unpack_from(view, OFF_SLOT_SIZE)[0]
+            if magic == MAGIC and version == VERSION and HEADER_SIZE + 2 * slot_size <= len(view):
+                break
+            self.close()
+        else:
+            return None, 0.0
+
+        for _ in range(self.retries):
+            seq = _U64.unpack_from(view, OFF_SEQ)[0]
+            if seq == 0:
+                return None, 0.0
+            if seq & 1:
+                time.sleep(0)
+                continue
+            slot = _U32.unpack_from(view, OFF_ACTIVE)[0] & 1
+            length = min(_U32.unpack_from(view, OFF_LENGTHS + 4 * slot)[0], slot_size)
+            published_at = _F64.unpack_from(view, OFF_PUBLISHED)[0]
+            offset = HEADER_SIZE + slot * slot_size
+            try:
+                text = str(view[offset:offset + length], "utf-8")
+            except UnicodeDecodeError:
+                text = None
+            if _U64.unpack_from(view, OFF_SEQ)[0] != seq or text is None:
+                continue
+            try:
+                return json.loads(text), published_at
+            except ValueError:
+                return None, 0.0
+        return None, 0.0
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,162 @@
+"""Two-tier system information cache: static fields once, volatile fields per ticket."""
+
+import threading
+import time
+from src.it_agent.collector import TIMED_OUT
+from src.it_agent.sysinfo import get_engine, get_current_user
+from src.it_agent.shared_snapshot import SnapshotReader, default_snapshot_path
+
+STATIC_KEYS = (
+    "hostname", "mac_address", "os_info", "total_ram", "logical_processors",
+    "username", "user_email",
+)
+VOLATILE_KEYS = (
+    "local_ip", "public_ip", "network_interfaces", "default_gateway",
+    "cpu_usage", "cpu_avg_1m", "cpu_peak_5m",
+    "ram_usage", "ram_peak_5m", "swap_usage",
+    "disk_usage", "volumes", "battery", "uptime",
+    "active_window", "telemetry_summary", "top_processes",
+)
+NETWORK_KEYS = ("hostname", "mac_address")
+SERVICE_KEYS = ("hostname", "mac_address", "os_info", "total_ram", "logical_processors")
+SERVICE_MAX_AGE = 600
+USER_KEYS = ("username", "user_email")
+
+STATIC_BUDGET = 30.0
+VOLATILE_BUDGET = 3.0
+VOLATILE_TTL = 2.0
+
+
+class SnapshotCache:
+    """Caches static sysinfo fields for the life of the tray process.
+
+    Static fields are collected once in the background by warm() and only
+    re-collected after an invalidation (network change, user change).
+    Machine-level static fields are taken from the snapshot published by
+    the service when it is fresh, so only the user fields are collected
+    in-process.
+    Volatile fields are re-collected on every get() unless the previous
+    reading is younger than the volatile TTL. The network fields are
+    volatile here because they are already cached by NetworkIdentity and
+    PublicIPResolver, so reading them is cheap.
+    """
+
+    def __init__(self, engine=None, volatile_ttl=VOLATILE_TTL, reader=None):
+        self.engine = engine or get_engine()
+        self.reader = reader if reader is not None else SnapshotReader(default_snapshot_path())
+        self.volatile_ttl = volatile_ttl
+        self._static = {}
+        self._volatile = {}
+        self._volatile_time = 0.0
+        self._user = None
+        self._lock = threading.Lock()
+        self._warm_thread = None
+
+    def warm(self):
+        """Collect the static tier in a background thread."""
+        if self._warm_thread is not None and self._warm_thread.is_alive():
+            return
+        self._warm_thread = threading.Thread(target=self._refresh_static, daemon=True)
+        self._warm_thread.start()
+
+    def _from_service(self):
+        """Fill missing machine-level static fields from the service-published snapshot."""
+        try:
+            data, published_at = self.reader.read()
+        except Exception:
+            return
+        if not data or time.time() - published_at > SERVICE_MAX_AGE:
+            return
+        with self._lock:
+            for key in SERVICE_KEYS:
+                if key not in self._static and key in data:
+                    self._static[key] = data[key]
+
+    def _refresh_static(self, budget=STATIC_BUDGET):
+        self._from_service()
+        with self._lock:
+            missing = [k for k in STATIC_KEYS if k not in self._static]
+        if not missing:
+            return
+        results = self.engine.collect(missing, budget=budget)
+        with self._lock:
+            for key in missing:
+                value = results.get(key, TIMED_OUT)
+                if value != TIMED_OUT:
+                    self._static[key] = value
+            if "username" in self._static:
+                self._user = self._static["username"]
+
+    def get_static(self):
+        with self._lock:
+            return dict(self._static)
+
+    def get(self, budget=VOLATILE_BUDGET, on_result=None, preset=None):
+        """Return a full sysinfo dict, paying only for what is not cached.
+
+        Args:
+            budget: overall time limit for fields that must be collected now
+            on_result: optional callback(key, value) for freshly collected fields
+            preset: dict of fields the caller already collected for this
+                request (e.g. the active window title read before the
+                ticket window took focus); these are not collected again
+        """
+        self._check_user()
+        preset = preset or {}
+        if any(k not in self._static for k in SERVICE_KEYS):
+            self._from_service()
+
+        with self._lock:
+            static = dict(self._static)
+            volatile_fresh = time.monotonic() - self._volatile_time < self.volatile_ttl
+            volatile = dict(self._volatile) if volatile_fresh else {}
+
+        keys = [k for k in STATIC_KEYS if k not in static]
+        if not volatile:
+            keys.extend(VOLATILE_KEYS)
+        keys = [k for k in keys if k not in preset]
+
+        fresh = self.engine.collect(keys, budget=budget, on_result=on_result) if keys else {"timed_out": []}
+
+        with self._lock:
+            for key in STATIC_KEYS:
+                if key in fresh and fresh[key] != TIMED_OUT:
+                    self._static[key] = fresh[key]
+            if not volatile:
+                merged = {**fresh, **preset}
+                self._volatile = {k: merged[k] for k in VOLATILE_KEYS if k in merged}
+                self._volatile_time = time.monotonic()
+
+        result = {**static, **volatile, **fresh, **preset}
+        result["timed_out"] = fresh.get("timed_out", [])
+        return result
+
+    def invalidate(self, keys=None):
+        """Drop cached fields so they are re-collected on the next get()."""
+        with self._lock:
+            for key in (keys if keys is not None else list(self._static)):
+                self._static.pop(key, None)
+            self._volatile = {}
+            self._volatile_time = 0.0
+
+    def on_network_change(self):
+        """Invalidation hook for interface or address changes."""
+        self.invalidate(NETWORK_KEYS)
+        self.warm()
+
+    def on_user_change(self):
+        """Invalidation hook for user logoff / a different user logging on."""
+        self.invalidate(USER_KEYS)
+        self.warm()
+
+    def _check_user(self):
+        if self._user is None:
+            return
+        try:
+            current = get_current_user()
+        except Exception:
+            return
+        if current != self._user:
+            print(f"[SnapshotCache] User changed from {self._user} to {current}; refreshing.")
+            self._user = current
+            self.on_user_change()
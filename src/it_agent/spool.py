@@ -0,0 +1,327 @@
+"""Durable on-disk spool for tickets that could not be sent, drained in the background."""
+
+import io
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from src.it_agent.paths import user_data_dir
+
+SPOOL_FILE = "spool.db"
+SCHEMA_VERSION = 1
+MAX_BYTES = int(float(os.environ.get("OCP_SPOOL_MAX_MB", 200)) * 1024 * 1024)
+MAX_AGE = float(os.environ.get("OCP_SPOOL_MAX_DAYS", 14)) * 86400
+ATTACHMENT_MAX_AGE = float(os.environ.get("OCP_SPOOL_ATTACHMENT_DAYS", 3)) * 86400
+RETRY_BASE = 30.0
+RETRY_MAX = 1800.0
+DRAIN_INTERVAL = 60.0
+
+PENDING = "pending"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    key TEXT NOT NULL REFERENCES tickets(key) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (key, seq)
+);
+"""
+
+
+class TicketSpool:
+    """SQLite-backed queue of unsent tickets, keyed by their idempotency key.
+
+    add() commits the ticket and its encoded attachments in one
+    transaction (WAL, synchronous=FULL), so a spooled ticket survives a
+    crash or a tray restart by the service. The database lives in the
+    per-user data directory because it holds screenshots.
+
+    start(send) runs a drainer thread that resubmits due tickets oldest
+    first, streaming attachments straight from the database.
+    `send(data, attachments, cancel)` returns (outcome, message) with
+    outcome "sent", "retry", "failed" or "cancelled": sent tickets are
+    deleted, retries back off exponentially (RETRY_BASE doubling up to
+    RETRY_MAX, with jitter), permanent failures are kept, not retried,
+    until evicted, and an upload cancelled by stop() is left as it was.
+    kick() retries everything now, e.g. when the network comes back.
+
+    Attachments are capped at MAX_BYTES in total and dropped oldest
+    ticket first, or once older than ATTACHMENT_MAX_AGE; the ticket is
+    still sent, with a note saying what was dropped. Tickets older than
+    MAX_AGE are dropped entirely.
+
+    Configured from the environment:
+        OCP_SPOOL_MAX_MB           total attachment bytes kept (default 200)
+        OCP_SPOOL_MAX_DAYS         age at which tickets are dropped (default 14)
+        OCP_SPOOL_ATTACHMENT_DAYS  age at which attachments are dropped (default 3)
+    """
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, max_age=MAX_AGE,
+                 attachment_max_age=ATTACHMENT_MAX_AGE):
+        self.path = path or os.path.join(user_data_dir(), SPOOL_FILE)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.attachment_max_age = attachment_max_age
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._send = None
+        self._ready = None
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                db.executescript(_SCHEMA)
+                db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA synchronous=FULL")
+        db.execute("PRAGMA foreign_keys=ON")
+        return _Closing(db)
+
+    def add(self, key, data, attachments=()):
+        """Store one ticket; a key that is already spooled is left as it is."""
+        now = time.time()
+        with self._lock, self._connect() as db:
+            cur = db.execute(
+                "INSERT OR IGNORE INTO tickets (key, created, data, next_attempt) VALUES (?, ?, ?, ?)",
+                (key, now, json.dumps(data, default=str), now + RETRY_BASE),
+            )
+            if cur.rowcount:
+                for seq, a in enumerate(attachments):
+                    view = a.view()
+                    db.execute(
+                        "INSERT INTO attachments VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, seq, a.filename, a.mime_type, json.dumps(a.params, default=str),
+                         len(view), view),
+                    )
+            self._evict(db, now)
+        self._wake.set()
+
+    def pending(self):
+        """Number of tickets still waiting to be sent."""
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM tickets WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status").fetchall())
+            size = db.execute("SELECT COALESCE(SUM(size), 0) FROM attachments").fetchone()[0]
+        return {"pending": counts.get(PENDING, 0), "failed": counts.get(FAILED, 0), "bytes": size}
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM tickets WHERE created < ?", (now - self.max_age,))
+        old = db.execute(
+            "SELECT DISTINCT a.key FROM attachments a JOIN tickets t USING (key) WHERE t.created < ?",
+            (now - self.attachment_max_age,),
+        ).fetchall()
+        for (key,) in old:
+            self._drop_attachments(db, key)
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM attachments").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = db.execute(
+            "SELECT a.key, SUM(a.size) FROM attachments a JOIN tickets t USING (key) "
+            "GROUP BY a.key ORDER BY t.created"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._drop_attachments(db, key)
+            total -= size
+
+    def _drop_attachments(self, db, key):
+        """Delete a ticket's attachments and say so in the ticket text."""
+        names = [r[0] for r in db.execute("SELECT filename FROM attachments WHERE key = ?", (key,))]
+        db.execute("DELETE FROM attachments WHERE key = ?", (key,))
+        data = json.loads(db.execute("SELECT data FROM tickets WHERE key = ?", (key,)).fetchone()[0])
+        data["spool_note"] = f"attachments dropped to save space: {', '.join(names)}"
+        db.execute("UPDATE tickets SET data = ? WHERE key = ?", (json.dumps(data), key))
+        print(f"[TicketSpool] Dropped attachments of {key}: {', '.join(names)}")
+
+    def start(self, send, ready=None):
+        """Start the drainer thread.
+
+        `send(data, attachments, cancel)` returns (outcome, message);
+        `ready()`, if given, returns seconds until the endpoint may be
+        tried (its circuit breaker), and the drainer sleeps until then.
+        """
+        self._send = send
+        self._ready = ready
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="spool-drain", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def kick(self):
+        """Make every pending ticket due now and wake the drainer."""
+        with self._lock, self._connect() as db:
+            db.execute("UPDATE tickets SET next_attempt = 0 WHERE status = ?", (PENDING,))
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"[TicketSpool] Drain failed: {e}")
+            self._wake.wait(self._next_wait())
+            self._wake.clear()
+
+    def _next_wait(self):
+        with self._connect() as db:
+            due = db.execute("SELECT MIN(next_attempt) FROM tickets WHERE status = ?", (PENDING,)).fetchone()[0]
+        wait = DRAIN_INTERVAL if due is None else min(DRAIN_INTERVAL, max(1.0, due - time.time()))
+        if self._ready is not None and due is not None:
+            wait = max(wait, min(DRAIN_INTERVAL, self._ready()))
+        return wait
+
+    def drain(self):
+        """Resubmit every due ticket once, oldest first; stops at the first retryable failure."""
+        if self._ready is not None and self._ready() > 0:
+            return
+        now = time.time()
+        with self._connect() as db:
+            due = db.execute(
+                "SELECT key FROM tickets WHERE status = ? AND next_attempt <= ? ORDER BY created",
+                (PENDING, now),
+            ).fetchall()
+        for (key,) in due:
+            if self._stop.is_set():
+                return
+            data, attachments = self._load(key)
+            outcome, message = self._send(data, attachments, cancel=self._stop)
+            if outcome == "cancelled":
+                return
+            self._record(key, outcome, message)
+            if outcome == "retry":
+                return
+
+    def _load(self, key):
+        with self._connect() as db:
+            created, data = db.execute("SELECT created, data FROM tickets WHERE key = ?", (key,)).fetchone()
+            rows = db.execute(
+                "SELECT rowid, filename, mime_type, params, size FROM attachments WHERE key = ? ORDER BY seq",
+                (key,),
+            ).fetchall()
+        data = json.loads(data)
+        note = f"queued while offline at {time.strftime('%Y-%m-%d %H:%M', time.localtime(created))}"
+        data["spool_note"] = f"{note}; {data['spool_note']}" if data.get("spool_note") else note
+        attachments = [SpooledAttachment(self, rowid, filename, mime_type, json.loads(params), size)
+                       for rowid, filename, mime_type, params, size in rows]
+        return data, attachments
+
+    def _record(self, key, outcome, message):
+        with self._lock, self._connect() as db:
+            if outcome == "sent":
+                db.execute("DELETE FROM tickets WHERE key = ?", (key,))
+                print(f"[TicketSpool] Sent spooled ticket {key}")
+                return
+            attempts = db.execute("SELECT attempts FROM tickets WHERE key = ?", (key,)).fetchone()[0] + 1
+            if outcome == "retry":
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** attempts) * random.uniform(0.5, 1.0)
+                db.execute("UPDATE tickets SET attempts = ?, next_attempt = ?, last_error = ? WHERE key = ?",
+                           (attempts, time.time() + delay, message, key))
+            else:
+                db.execute("UPDATE tickets SET attempts = ?, status = ?, last_error = ? WHERE key = ?",
+                           (attempts, FAILED, message, key))
+                print(f"[TicketSpool] Spooled ticket {key} rejected: {message}")
+
+
+class SpooledAttachment:
+    """A spooled attachment whose bytes are streamed from the database, never loaded whole.
+
+    Has the filename / mime_type / params / size / reader() interface the
+    multipart encoder reads from, like AttachmentBuffer.
+    """
+
+    def __init__(self, spool, rowid, filename, mime_type, params, size):
+        self._spool = spool
+        self._rowid = rowid
+        self.filename = filename
+        self.mime_type = mime_type
+        self.params = params
+        self.size = size
+
+    def reader(self):
+        """Open a read-only incremental blob reader (its own connection, closed with it)."""
+        return _BlobReader(sqlite3.connect(self._spool.path, timeout=10), self._rowid)
+
+    def close(self):
+        pass
+
+
+class _BlobReader(io.RawIOBase):
+    def __init__(self, db, rowid):
+        self._db = db
+        self._blob = db.blobopen("attachments", "data", rowid, readonly=True)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._blob.read(size)
+
+    def readinto(self, b):
+        data = self._blob.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._blob.close()
+            self._db.close()
+        super().close()
+
+
+class _Closing:
+    """sqlite3 connection as a context manager that commits (or rolls back) and closes."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                self.db.commit()
+            else:
+                self.db.rollback()
+        finally:
+            self.db.close()
+
+
+_spool = None
+
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        _spool = TicketSpool()
+    return _spool
@@ -6,7 +6,13 @@ import os
 import uuid
 import time
 import psutil
-import requests as req_lib
+from src.it_agent.collector import CollectionEngine, Collector
+from src.it_agent.sampler import get_sampler
+from src.it_agent.identity import get_resolver, get_user_sid
+from src.it_agent.network import get_network, get_public_ip_resolver
+from src.it_agent.telemetry import get_summary as get_telemetry_summary
+from src.it_agent.processes import get_process_table
+from src.it_agent.disks import get_disk_prober
 
 
 def get_hostname():
@@ -14,24 +20,32 @@ def get_hostname():
 
 
 def get_local_ip():
+    """Primary IPv4 address from the cached network identity (never "N/A" offline)."""
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
+        return get_network().primary_ip()
     except Exception:
         return "N/A"
 
 
-def get_public_ip():
+def get_network_interfaces():
+    try:
+        return get_network().summary()
+    except Exception:
+        return "N/A"
+
+
+def get_default_gateway():
     try:
-        response = req_lib.get("https://api.ipify.org", timeout=3)
-        return response.text
+        return get_network().snapshot()["default_gateway"] or "N/A"
     except Exception:
         return "N/A"
 
 
+def get_public_ip():
+    """Cached public IP; the lookup itself runs in the background."""
+    return get_public_ip_resolver().get()
+
+
 def get_mac_address():
     try:
         mac = uuid.getnode()
@@ -48,14 +62,47 @@ def get_current_user():
         return os.environ.get("USERNAME", os.environ.get("USER", "Unknown"))
 
 
+def _sampled(key):
+    """Read a value from the background sampler, or None if it has no data yet."""
+    sampler = get_sampler()
+    if sampler.running and sampler.has_data():
+        return sampler.snapshot()[key]
+    return None
+
+
 def get_cpu_usage():
+    value = _sampled("cpu_current")
+    if value is not None:
+        return value
     return psutil.cpu_percent(interval=0.5)
 
 
+def get_cpu_average():
+    value = _sampled("cpu_avg_1m")
+    return "N/A" if value is None else value
+
+
+def get_cpu_peak():
+    value = _sampled("cpu_peak_5m")
+    return "N/A" if value is None else value
+
+
 def get_ram_usage():
     return psutil.virtual_memory().percent
 
 
+def get_ram_peak():
+    value = _sampled("ram_peak_5m")
+    return "N/A" if value is None else value
+
+
+def get_swap_usage():
+    try:
+        return psutil.swap_memory().percent
+    except Exception:
+        return "N/A"
+
+
 def get_disk_usage():
     try:
         if platform.system() == "Windows":
@@ -68,6 +115,11 @@ def get_disk_usage():
         return 0.0
 
 
+def get_volumes():
+    """Usage of every mounted volume; dead network drives are skipped with backoff."""
+    return get_disk_prober().collect()
+
+
 def get_uptime():
     try:
         boot_time = psutil.boot_time()
@@ -112,6 +164,10 @@ def get_logical_processors():
         return "N/A"
 
 
+def get_top_processes():
+    return get_process_table().collect()
+
+
 def get_os_info():
     system = platform.system()
     if system == "Windows":
@@ -149,74 +205,97 @@ def get_active_window_title():
             return "Unknown"
 
 
-def get_user_email():
-    """Attempt to get the logged-in user's email from Windows.
-    
-    Tries multiple sources in order:
-    1. whoami /upn (Azure AD / domain UPN - most reliable)
-    2. Office 365 registry identity
-    3. Windows account email from registry
-    """
-    if platform.system() != "Windows":
-        return ""
+def get_active_window_rect():
+    """Get the foreground window's (left, top, right, bottom) on screen, or None (Windows-specific).
 
+    Uses the DWM extended frame bounds, which exclude the invisible resize
+    border, and falls back to GetWindowRect. Minimized windows return None.
+    """
     try:
-        import subprocess
-        result = subprocess.run(
-            ["whoami", "/upn"],
-            capture_output=True, text=True, timeout=5
-        )
-        upn = result.stdout.strip()
-        if upn and "@" in upn:
-            return upn
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        user32.GetForegroundWindow.restype = wintypes.HWND
+        hwnd = user32.GetForegroundWindow()
+        if not hwnd or user32.IsIconic(hwnd):
+            return None
+        rect = wintypes.RECT()
+        try:
+            DWMWA_EXTENDED_FRAME_BOUNDS = 9
+            hr = ctypes.windll.dwmapi.DwmGetWindowAttribute(
+                wintypes.HWND(hwnd), DWMWA_EXTENDED_FRAME_BOUNDS, ctypes.byref(rect), ctypes.sizeof(rect))
+        except Exception:
+            hr = -1
+        if hr != 0 and not user32.GetWindowRect(wintypes.HWND(hwnd), ctypes.byref(rect)):
+            return None
+        if rect.right <= rect.left or rect.bottom <= rect.top:
+            return None
+        return rect.left, rect.top, rect.right, rect.bottom
     except Exception:
-        pass
+        return None
 
-    try:
-        import subprocess
-        result = subprocess.run(
-            ["powershell", "-Command",
-             "(Get-ItemProperty -Path 'HKCU:\\Software\\Microsoft\\Office\\16.0\\Common\\Identity' -Name 'ADUserName' -ErrorAction SilentlyContinue).ADUserName"],
-            capture_output=True, text=True, timeout=5
-        )
-        email = result.stdout.strip()
-        if email and "@" in email:
-            return email
-    except Exception:
-        pass
 
-    try:
-        import subprocess
-        result = subprocess.run(
-            ["powershell", "-Command",
-             "(Get-ItemProperty -Path 'HKCU:\\Software\\Microsoft\\IdentityCRL\\UserExtendedProperties\\*' -ErrorAction SilentlyContinue | Select-Object -First 1).PSChildName"],
-            capture_output=True, text=True, timeout=5
-        )
-        email = result.stdout.strip()
-        if email and "@" in email:
-            return email
-    except Exception:
-        pass
-
-    return ""
-
-
-def gather_all():
-    """Gather all system information into a dictionary."""
-    return {
-        "hostname": get_hostname(),
-        "local_ip": get_local_ip(),
-        "public_ip": get_public_ip(),
-        "mac_address": get_mac_address(),
-        "username": get_current_user(),
-        "user_email": get_user_email(),
-        "cpu_usage": get_cpu_usage(),
-        "ram_usage": get_ram_usage(),
-        "disk_usage": get_disk_usage(),
-        "os_info": get_os_info(),
-        "active_window": get_active_window_title(),
-        "uptime": get_uptime(),
-        "battery": get_battery_status(),
-        "total_ram": get_total_ram(),
-        "logical_processors": get_logical_processors(),
-    }
+def get_user_email():
+    """Get the logged-in user's email (UPN) from the cached identity resolver.
+
+    In-process sources (GetUserNameExW UPN, Office and IdentityCRL registry
+    keys) are tried before the whoami subprocess. Results, including
+    misses, are cached per user on disk.
+    """
+    return get_resolver().resolve(get_current_user(), get_user_sid())
+
+
+COLLECTORS = [
+    Collector("hostname", get_hostname, timeout=1.0),
+    Collector("local_ip", get_local_ip, timeout=1.0),
+    Collector("public_ip", get_public_ip, timeout=1.0),
+    Collector("network_interfaces", get_network_interfaces, timeout=1.0),
+    Collector("default_gateway", get_default_gateway, timeout=1.0),
+    Collector("mac_address", get_mac_address, timeout=1.0),
+    Collector("username", get_current_user, timeout=1.0, default="Unknown"),
+    Collector("user_email", get_user_email, timeout=3.0, default=""),
+    Collector("cpu_usage", get_cpu_usage, timeout=1.0, default=0),
+    Collector("cpu_avg_1m", get_cpu_average, timeout=1.0),
+    Collector("cpu_peak_5m", get_cpu_peak, timeout=1.0),
+    Collector("ram_usage", get_ram_usage, timeout=1.0, default=0),
+    Collector("ram_peak_5m", get_ram_peak, timeout=1.0),
+    Collector("swap_usage", get_swap_usage, timeout=1.0),
+    Collector("disk_usage", get_disk_usage, timeout=1.5, default=0),
+    Collector("volumes", get_volumes, timeout=2.0, default=[]),
+    Collector("os_info", get_os_info, timeout=1.0, default="Unknown"),
+    Collector("active_window", get_active_window_title, timeout=1.5, default="Unknown"),
+    Collector("uptime", get_uptime, timeout=1.0),
+    Collector("battery", get_battery_status, timeout=1.0),
+    Collector("total_ram", get_total_ram, timeout=1.0),
+    Collector("logical_processors", get_logical_processors, timeout=1.0),
+    Collector("telemetry_summary", get_telemetry_summary, timeout=1.0, default=""),
+    Collector("top_processes", get_top_processes, timeout=1.5),
+]
+
+MACHINE_KEYS = ("hostname", "mac_address", "os_info", "total_ram", "logical_processors")
+
+_engine = None
+
+
+def get_engine():
+    """Return the shared collection engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = CollectionEngine(COLLECTORS)
+    return _engine
+
+
+def gather_all(budget=3.0, on_result=None):
+    """Gather all system information into a dictionary.
+
+    Collectors run in parallel; any that miss their deadline are returned
+    as "Timed out" and listed under the "timed_out" key.
+    """
+    return get_engine().collect(budget=budget, on_result=on_result)
+
+
+def gather_machine_inventory(budget=10.0):
+    """Machine-level fields only (no user or session data), for the service to publish."""
+    results = get_engine().collect(MACHINE_KEYS, budget=budget)
+    timed_out = results.pop("timed_out", [])
+    return {k: v for k, v in results.items() if k not in timed_out}
@@ -0,0 +1,257 @@
+"""Compact on-disk metrics history with automatic downsampling tiers."""
+
+import os
+import struct
+import threading
+import time
+from src.it_agent.paths import program_data_dir
+
+RECORD = struct.Struct("<Ifffff")
+
+TIERS = (
+    ("10s", 10, 3600),
+    ("1m", 60, 86400),
+    ("15m", 900, 7 * 86400),
+)
+FLUSH_INTERVAL = 60
+COMPACT_FACTOR = 2
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def _append_records(path, data):
+    """Append whole records to `path` and return the file's new size.
+
+    A partial record left at the end by an earlier failed write is cut
+    off first, and a write that fails is rolled back to where it
+    started, so the file always holds a whole number of records.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        size = 0
+    size -= size % RECORD.size
+    try:
+        with open(path, "ab") as f:
+            f.truncate(size)
+            f.write(data)
+    except OSError:
+        try:
+            os.truncate(path, size)
+        except OSError:
+            pass
+        raise
+    return size + len(data)
+
+
+class _Bucket:
+    """Running avg/max aggregate for one time bucket of one tier."""
+
+    def __init__(self, start):
+        self.start = start
+        self.n = 0
+        self.cpu_sum = 0.0
+        self.cpu_max = 0.0
+        self.ram_sum = 0.0
+        self.ram_max = 0.0
+        self.disk = 0.0
+
+    def add(self, cpu_avg, cpu_max, ram_avg, ram_max, disk, weight=1):
+        self.n += weight
+        self.cpu_sum += cpu_avg * weight
+        self.cpu_max = max(self.cpu_max, cpu_max)
+        self.ram_sum += ram_avg * weight
+        self.ram_max = max(self.ram_max, ram_max)
+        self.disk = disk
+
+    def record(self):
+        return (self.start, self.cpu_sum / self.n, self.cpu_max,
+                self.ram_sum / self.n, self.ram_max, self.disk)
+
+
+class _Tier:
+    def __init__(self, directory, name, step, retention):
+        self.name = name
+        self.step = step
+        self.capacity = retention // step
+        self.path = os.path.join(directory, f"metrics_{name}.bin") if directory else None
+        self.bucket = None
+        self.pending = []
+
+
+class TelemetryStore:
+    """Append-only metrics files, one per downsampling tier.
+
+    Samples are folded into 10 s buckets; every closed bucket is rolled
+    up into the 1 min tier, and so on. Closed records are buffered in
+    memory and appended to disk in one write per tier every
+    FLUSH_INTERVAL seconds. A tier file is compacted back to its
+    retention once it reaches COMPACT_FACTOR times that size, so each
+    file stays under COMPACT_FACTOR times its retention plus one flush.
+    """
+
+    def __init__(self, directory=None, flush_interval=FLUSH_INTERVAL):
+        if directory is None:
+            directory = program_data_dir("telemetry")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.tiers = [_Tier(directory, name, step, retention) for name, step, retention in TIERS]
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+
+    def add_sample(self, cpu, ram, disk, ts=None):
+        """Fold one raw sample into the finest tier."""
+        ts = int(ts if ts is not None else time.time())
+        with self._lock:
+            self._add(0, ts, cpu, cpu, ram, ram, disk, 1)
+            if ts - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+                self._last_flush = ts
+
+    def _add(self, level, ts, cpu_avg, cpu_max, ram_avg, ram_max, disk, weight):
+        tier = self.tiers[level]
+        start = ts - ts % tier.step
+        if tier.bucket is not None and tier.bucket.start != start:
+            record = tier.bucket.record()
+            tier.pending.append(record)
+            if level + 1 < len(self.tiers):
+                self._add(level + 1, record[0], *record[1:], weight=tier.bucket.n)
+            tier.bucket = None
+        if tier.bucket is None:
+            tier.bucket = _Bucket(start)
+        tier.bucket.add(cpu_avg, cpu_max, ram_avg, ram_max, disk, weight)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        for tier in self.tiers:
+            if not tier.pending or not tier.path:
+                continue
+            data = b"".join(RECORD.pack(*r) for r in tier.pending)
+            try:
+                size = _append_records(tier.path, data)
+                tier.pending = []
+                if size >= tier.capacity * RECORD.size * COMPACT_FACTOR:
+                    self._compact(tier)
+            except OSError as e:
+                print(f"[Telemetry] Could not write {tier.path}: {e}")
+                tier.pending = tier.pending[-tier.capacity:]
+
+    def _compact(self, tier):
+        keep = tier.capacity * RECORD.size
+        with open(tier.path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size - size % RECORD.size
+            f.seek(max(0, end - keep))
+            data = f.read(end - f.tell())
+        tmp = tier.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, tier.path)
+
+    def read(self, tier_name, since):
+        """Return records of one tier with timestamp >= since, oldest first."""
+        with self._lock:
+            tier = next(t for t in self.tiers if t.name == tier_name)
+            pending = list(tier.pending)
+            if tier.bucket is not None:
+                pending.append(tier.bucket.record())
+
+        records = []
+        if tier.path and os.path.exists(tier.path):
+            try:
+                with open(tier.path, "rb") as f:
+                    size = f.seek(0, os.SEEK_END)
+                    span = min(size - size % RECORD.size, tier.capacity * RECORD.size)
+                    f.seek(size - size % RECORD.size - span)
+                    data = f.read(span)
+                records = [r for r in RECORD.iter_unpack(data) if r[0] >= since]
+            except OSError:
+                pass
+        return records + [r for r in pending if r[0] >= since]
+
+    def summary(self, window=3600, columns=12):
+        """Render the last `window` seconds as a short text block for a ticket."""
+        now = int(time.time())
+        records = self.read(TIERS[0][0], now - window)
+        if not records:
+            return ""
+
+        n = len(records)
+        cpu_avg = sum(r[1] for r in records) / n
+        cpu_max = max(r[2] for r in records)
+        ram_avg = sum(r[3] for r in records) / n
+        ram_max = max(r[4] for r in records)
+        disk = records[-1][5]
+
+        slot = window / columns
+        cols = [0.0] * columns
+        for r in records:
+            i = min(columns - 1, max(0, int((r[0] - (now - window)) / slot)))
+            cols[i] = max(cols[i], r[2])
+        spark = "".join(SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(v / 100 * len(SPARK_CHARS)))] for v in cols)
+
+        minutes = (now - records[0][0]) // 60
+        return (
+            f"Window: last {minutes} min ({n} samples)\n"
+            f"CPU: avg {cpu_avg:.1f}%, max {cpu_max:.1f}%\n"
+            f"CPU max per {int(slot // 60)} min: {spark}\n"
+            f"RAM: avg {ram_avg:.1f}%, max {ram_max:.1f}%\n"
+            f"Disk: {disk:.1f}%\n"
+        )
+
+
+class TelemetryRecorder:
+    """Feeds the store from the background sampler's listener hook."""
+
+    def __init__(self, store, disk_reader):
+        self.store = store
+        self.disk_reader = disk_reader
+        self._disk = 0.0
+        self._disk_time = 0.0
+
+    def __call__(self, sampler):
+        snap = sampler.snapshot()
+        if snap["cpu_current"] is None:
+            return
+        now = time.time()
+        if now - self._disk_time >= TIERS[0][1]:
+            try:
+                value = self.disk_reader()
+                self._disk = float(value) if isinstance(value, (int, float)) else self._disk
+            except Exception:
+                pass
+            self._disk_time = now
+        self.store.add_sample(snap["cpu_current"], snap["ram_current"], self._disk, now)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = TelemetryStore()
+    return _store
+
+
+def get_summary():
+    """Last-hour summary from the running store, or "" if telemetry is not active."""
+    if _store is None:
+        return ""
+    return _store.summary()
+
+
+def start_telemetry(sampler, disk_reader):
+    """Attach a recorder for the shared store to a running MetricsSampler."""
+    try:
+        store = get_store()
+    except OSError as e:
+        print(f"[Telemetry] Disabled: {e}")
+        return None
+    sampler.add_listener(TelemetryRecorder(store, disk_reader))
+    return store
@@ -3,9 +3,22 @@
 import threading
 import os
 import sys
+from functools import partial
 from PIL import Image, ImageDraw
-from src.it_agent.sysinfo import gather_all
+from src.it_agent.api import get_metadata, post_ticket, prewarm as prewarm_api, tickets_retry_in
+from src.it_agent.http_client import get_client
 from src.it_agent.screenshot import capture_screenshot
+from src.it_agent.capture import get_capture_manager
+from src.it_agent.replay import get_replay
+from src.it_agent.snapshot import SnapshotCache
+from src.it_agent.spool import get_spool
+from src.it_agent.sysinfo import get_active_window_title, get_disk_usage
+from src.it_agent.telemetry import start_telemetry, get_store
+from src.it_agent.processes import start_process_priming
+from src.it_agent.sampler import start_sampler, get_sampler
+from src.it_agent.network import get_network, get_public_ip_resolver
+
+WINDOW_CHECK_TIMEOUT = 1.0
 
 
 def _resource_path(relative_path):
@@ -58,9 +71,27 @@ class TrayManager:
         self._tray_thread = None
         self._running = True
         self._keyboard_module = None
+        self.snapshot = SnapshotCache()
 
     def start(self):
         """Start the system tray icon and global hotkey listener."""
+        sampler = start_sampler()
+        start_telemetry(sampler, get_disk_usage)
+        start_process_priming(sampler)
+        self.snapshot.warm()
+
+        network = get_network()
+        network.add_listener(self._on_network_change)
+        network.start()
+        get_public_ip_resolver().refresh()
+        threading.Thread(target=get_capture_manager().select, daemon=True).start()
+        get_replay().start()
+        get_metadata().prefetch()
+        try:
+            get_spool().start(post_ticket, ready=tickets_retry_in)
+        except Exception as e:
+            print(f"[TrayManager] Offline ticket spool unavailable: {e}")
+
         self._tray_thread = threading.Thread(target=self._run_tray, daemon=True)
         self._tray_thread.start()
 
@@ -104,18 +135,38 @@ class TrayManager:
                 print("[TrayManager] Note: The 'keyboard' library requires root/admin privileges on Linux.")
 
     def _on_hotkey_pressed(self):
-        """Handle the F8 key press: capture screenshot, then open GUI."""
+        """Handle the F8 key press: capture screenshot, open the GUI, then fill in sysinfo.
+
+        The window opens with the cached static fields and placeholders for
+        the rest; volatile fields are streamed in while the user types. If
+        a ticket window is already open it is only focused: nothing is
+        captured or collected for it.
+        """
         if not self._running:
             return
+        if self._ticket_window_open():
+            self.app.after(0, self.app.focus_ticket_window)
+            return
 
+        prewarm_api()
         try:
-            screenshot_buf, screenshot_img = capture_screenshot()
+            screenshot_job, screenshot_frame = capture_screenshot()
         except Exception as e:
             print(f"[TrayManager] Screenshot capture failed: {e}")
-            screenshot_buf, screenshot_img = None, None
+            screenshot_job, screenshot_frame = None, None
+
+        replay_job = get_replay().encode_clip() if get_replay().running else None
+
+        preset = {
+            "active_window": get_active_window_title(),
+            "screen_capture": get_capture_manager().describe_last() if screenshot_frame else "N/A",
+        }
+        initial = {**self.snapshot.get_static(), **preset}
+        token = object()
+        self.app.after(0, self.app.open_ticket_window, initial, screenshot_job, screenshot_frame, replay_job, token)
 
         try:
-            sysinfo = gather_all()
+            sysinfo = self.snapshot.get(on_result=partial(self._on_info_result, token), preset=preset)
         except Exception as e:
             print(f"[TrayManager] System info gathering failed: {e}")
             sysinfo = {
@@ -127,7 +178,37 @@ class TrayManager:
                 "total_ram": "N/A", "logical_processors": "N/A",
             }
 
-        self.app.after(0, self.app.open_ticket_window, sysinfo, screenshot_buf, screenshot_img)
+        self.app.after(0, self.app.complete_ticket_info, sysinfo, token)
+
+    def _ticket_window_open(self):
+        """Ask the Tk thread whether a ticket window is showing (False if it does not answer in time)."""
+        answer = {}
+        done = threading.Event()
+
+        def check():
+            answer["open"] = self.app.ticket_window_open()
+            done.set()
+
+        self.app.after(0, check)
+        done.wait(WINDOW_CHECK_TIMEOUT)
+        return answer.get("open", False)
+
+    def _on_info_result(self, token, key, value):
+        """Stream each collector result to the ticket window of the press that collected it."""
+        self.app.after(0, self.app.update_ticket_info, key, value, token)
+
+    def _on_network_change(self, snapshot):
+        """Interface table changed: drop cached network identity and pooled connections."""
+        get_public_ip_resolver().invalidate()
+        get_public_ip_resolver().refresh()
+        self.snapshot.on_network_change()
+        get_client().reset()
+        prewarm_api()
+        get_metadata().prefetch(retry_failed=True)
+        try:
+            get_spool().kick()
+        except Exception as e:
+            print(f"[TrayManager] Could not wake the ticket spool: {e}")
 
     def _on_open(self, icon=None, item=None):
         """Open the ticket window from tray menu."""
@@ -146,6 +227,18 @@ class TrayManager:
     def stop(self):
         """Stop the tray icon and clean up hotkey listener."""
         self._running = False
+        get_sampler().stop()
+        get_network().stop()
+        get_replay().stop()
+        get_client().close()
+        try:
+            get_spool().stop()
+        except Exception:
+            pass
+        try:
+            get_store().flush()
+        except Exception:
+            pass
 
         if self._keyboard_module:
             try: